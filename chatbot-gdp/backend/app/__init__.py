@@ -26,6 +26,8 @@ def create_app():
     openai_client = OpenAI(
         api_key=config.OPENAI_API_KEY,
         # Remove the proxies parameter if it exists
+        timeout=config.OPENAI_TIMEOUT,
+        max_retries=config.OPENAI_MAX_RETRIES
     )
     
     # Initialize database
@@ -33,17 +35,26 @@ def create_app():
     db = DatabaseHandler()
     db.create_tables()
     
-    # Initialize chatbot with the client
-    from .chat_handler import WealthChatbot
-    chatbot = WealthChatbot(openai_client)
+    # Initialize conversations (one chatbot per conversation, shared db and index)
+    from .conversations import ConversationManager
+    conversations = ConversationManager(openai_client, db=db)
+    
+    # Initialize batch search on the same retriever
+    from .search import SearchService
+    search = SearchService(openai_client, conversations.retriever)
     
     # Store instances in app context
     app.openai_client = openai_client
     app.db = db
-    app.chatbot = chatbot
+    app.conversations = conversations
+    app.search = search
+
+    # On-demand profiling hooks (inactive until started from /api/admin/profile)
+    from .profiling import init_profiling
+    init_profiling(app)
 
     # Register routes
-    with app.app_context():
-        from . import routes
+    from .routes import api_bp
+    app.register_blueprint(api_bp, url_prefix='/api')
     
     return app
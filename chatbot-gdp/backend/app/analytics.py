@@ -0,0 +1,216 @@
+import re
+import sys
+import json
+from collections import Counter
+from typing import Optional, List, Dict, Tuple
+from config import config
+
+# Dimensions agrégées ; 'objectif' compte une ligne par objectif choisi
+DIMENSIONS = ["total", "profession", "revenu_annuel", "patrimoine_actuel", "objectif"]
+GRANULARITIES = {"day": 10, "month": 7}
+UNKNOWN = "inconnu"
+
+# Colonnes de la table leads nécessaires au calcul des contributions
+STATS_COLUMNS = [
+    'created_at', 'nom', 'prenom', 'email', 'telephone', 'age',
+    'situation_familiale', 'profession', 'revenu_annuel',
+    'patrimoine_actuel', 'objectifs_patrimoniaux'
+]
+
+
+def create_stats_table(cursor):
+    """Crée la table des compteurs pré-agrégés."""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS lead_stats (
+        granularity TEXT NOT NULL,
+        bucket TEXT NOT NULL,
+        dimension TEXT NOT NULL,
+        value TEXT NOT NULL,
+        leads INTEGER NOT NULL DEFAULT 0,
+        completed INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (granularity, dimension, bucket, value)
+    )
+    ''')
+
+
+def _bounds(label: str) -> Tuple[float, float]:
+    """Bornes [min, max[ d'une tranche ("Moins de 30 000€", "30 000€ - 40 000€", "Plus de 250 000€")."""
+    amounts = [float(n.replace(" ", "")) for n in re.findall(r"\d[\d ]*\d|\d", label)]
+    if label.startswith("Moins"):
+        return 0.0, amounts[0]
+    if label.startswith("Plus"):
+        return amounts[0], float("inf")
+    return amounts[0], amounts[1]
+
+
+# Tranches proposées à l'utilisateur, utilisées pour regrouper les montants
+BRACKETS = {
+    "revenu_annuel": [(label, *_bounds(label)) for label in config.REVENUS],
+    "patrimoine_actuel": [(label, *_bounds(label)) for label in config.PATRIMOINE]
+}
+
+
+def bracket(dimension: str, value) -> str:
+    """Tranche d'un montant : libellé de config.REVENUS / config.PATRIMOINE, ou UNKNOWN."""
+    if value is None:
+        return UNKNOWN
+    labels = BRACKETS[dimension]
+    if any(value == label for label, _, _ in labels):
+        return value
+    try:
+        amount = float(str(value).replace(" ", "").replace("€", "").replace(",", "."))
+    except ValueError:
+        return UNKNOWN
+    for label, low, high in labels:
+        if low <= amount < high:
+            return label
+    return UNKNOWN
+
+
+def _objectifs(value) -> List[str]:
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            return [value]
+    if isinstance(value, list) and value:
+        return [str(v) for v in value]
+    return [UNKNOWN]
+
+
+def contributions(row: Optional[dict], required_fields: List[str]) -> Counter:
+    """Compteurs apportés par un lead : {(granularité, bucket, dimension, valeur): (leads, complétés)}.
+
+    Args:
+        row (Optional[dict]): Les colonnes STATS_COLUMNS du lead (None si absent)
+        required_fields (List[str]): Les champs qui définissent un lead complet
+    """
+    counts = Counter()
+    if row is None:
+        return counts
+
+    completed = int(all(row.get(f) is not None for f in required_fields))
+    values = {
+        "total": ["all"],
+        "profession": [row.get("profession") or UNKNOWN],
+        "revenu_annuel": [bracket("revenu_annuel", row.get("revenu_annuel"))],
+        "patrimoine_actuel": [bracket("patrimoine_actuel", row.get("patrimoine_actuel"))],
+        "objectif": _objectifs(row.get("objectifs_patrimoniaux"))
+    }
+    created_at = str(row.get("created_at") or "")
+    for granularity, length in GRANULARITIES.items():
+        bucket = created_at[:length] if len(created_at) >= length else UNKNOWN
+        for dimension, dimension_values in values.items():
+            for value in dimension_values:
+                counts[(granularity, bucket, dimension, value, "leads")] += 1
+                counts[(granularity, bucket, dimension, value, "completed")] += completed
+    return counts
+
+
+def apply_delta(cursor, old: Counter, new: Counter):
+    """Applique la différence entre deux contributions dans la transaction courante."""
+    delta: Dict[Tuple[str, str, str, str], List[int]] = {}
+    for key in set(old) | set(new):
+        diff = new[key] - old[key]
+        if diff:
+            entry = delta.setdefault(key[:4], [0, 0])
+            entry[0 if key[4] == "leads" else 1] += diff
+    if not delta:
+        return
+    cursor.executemany('''
+    INSERT INTO lead_stats (granularity, bucket, dimension, value, leads, completed)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (granularity, dimension, bucket, value) DO UPDATE SET
+        leads = leads + excluded.leads,
+        completed = completed + excluded.completed
+    ''', [(*key, leads, completed) for key, (leads, completed) in delta.items()])
+    # Un lead qui quitte une valeur (ex: profession renseignée) ne laisse pas de ligne vide
+    cursor.executemany(
+        "DELETE FROM lead_stats WHERE granularity = ? AND bucket = ? AND dimension = ? AND value = ? AND leads <= 0",
+        [key for key, (leads, _) in delta.items() if leads < 0]
+    )
+
+
+def needs_backfill(cursor) -> bool:
+    """Indique si lead_stats contient des montants non regroupés en tranches (ancien format)."""
+    labels = [UNKNOWN] + [label for labels in BRACKETS.values() for label, _, _ in labels]
+    cursor.execute(f'''
+    SELECT 1 FROM lead_stats
+    WHERE dimension IN ('revenu_annuel', 'patrimoine_actuel')
+    AND value NOT IN ({", ".join("?" for _ in labels)})
+    LIMIT 1
+    ''', labels)
+    return cursor.fetchone() is not None
+
+
+def query_stats(cursor, dimension: str, granularity: str = "month",
+                start: Optional[str] = None, end: Optional[str] = None) -> List[dict]:
+    """Lit les compteurs d'une dimension, sans parcourir la table leads.
+
+    Raises:
+        ValueError: si la dimension ou la granularité est inconnue
+    """
+    if dimension not in DIMENSIONS:
+        raise ValueError(f"Unknown dimension, expected one of: {', '.join(DIMENSIONS)}")
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity, expected one of: {', '.join(GRANULARITIES)}")
+
+    query = "SELECT bucket, value, leads, completed FROM lead_stats WHERE granularity = ? AND dimension = ?"
+    params = [granularity, dimension]
+    if start:
+        query += " AND bucket >= ?"
+        params.append(start)
+    if end:
+        query += " AND bucket <= ?"
+        params.append(end)
+    query += " ORDER BY bucket, value"
+    cursor.execute(query, params)
+
+    return [
+        {
+            "bucket": bucket,
+            "value": value,
+            "leads": leads,
+            "completed": completed,
+            "completion_rate": round(completed / leads, 3) if leads else 0.0
+        }
+        for bucket, value, leads, completed in cursor.fetchall()
+    ]
+
+
+def backfill(db) -> int:
+    """Recalcule entièrement lead_stats à partir des leads existants.
+
+    Args:
+        db (DatabaseHandler): La base à recalculer
+
+    Returns:
+        int: Le nombre de leads pris en compte
+    """
+    from .models import Lead
+
+    conn = db.conn
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        totals = Counter()
+        count = 0
+        rows = conn.execute(f"SELECT {', '.join(STATS_COLUMNS)} FROM leads")
+        for row in rows:
+            totals.update(contributions(dict(zip(STATS_COLUMNS, row)), Lead.REQUIRED_FIELDS))
+            count += 1
+        cursor.execute("DELETE FROM lead_stats")
+        apply_delta(cursor, Counter(), totals)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return count
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["backfill"]:
+        print("Usage: python -m app.analytics backfill")
+        sys.exit(1)
+    from .models import DatabaseHandler
+    print(f"{backfill(DatabaseHandler())} leads agrégés dans lead_stats")
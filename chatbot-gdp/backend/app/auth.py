@@ -0,0 +1,11 @@
+import hmac
+from flask import request
+from config import config
+
+
+def is_admin_request() -> bool:
+    """Vérifie le jeton 'Authorization: Bearer <ADMIN_TOKEN>' des routes internes."""
+    if not config.ADMIN_TOKEN:
+        return False
+    token = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+    return hmac.compare_digest(token, config.ADMIN_TOKEN)
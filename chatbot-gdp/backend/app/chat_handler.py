@@ -1,49 +1,170 @@
 from config import config
-from app import app_instance
 import os
+import re
 import json
 import uuid
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime
-import faiss
 import numpy as np
 from config import config
-from .models import Lead, DatabaseHandler
-from .untils import DataValidator
+from .models import Lead, DatabaseHandler, StaleLeadError
+from .untils import DataValidator, normalize_string, normalize_email, normalize_phone
+from .facets import CONTENT_TYPE_LABELS
+from .retrieval import create_retriever
+from .routing import router
+
+# Analyses lancées en avance, pendant que l'utilisateur rédige son commentaire
+speculation_pool = ThreadPoolExecutor(max_workers=config.SPECULATIVE_WORKERS,
+                                      thread_name_prefix="speculation")
+
+EXTRACTION_FUNCTION = {
+    "name": "extract_lead_info",
+    "description": "Extrait et valide les informations du prospect",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "nom": {"type": "string"},
+            "prenom": {"type": "string"},
+            "email": {"type": "string"},
+            "telephone": {"type": "string"},
+            "age": {"type": "integer"},
+            "situation_familiale": {"type": "string"},
+            "profession": {"type": "string"},
+            "revenu_annuel": {"type": "number"},
+            "patrimoine_actuel": {
+                "type": "object",
+                "properties": {
+                    "montant": {"type": "number"},
+                    "details": {"type": "string"}
+                }
+            },
+            "objectifs_patrimoniaux": {"type": "array", "items": {"type": "string"}}
+        }
+    }
+}
+
+
+def build_extraction_messages(conversation_context: str, current_field: str, user_message: str) -> list:
+    """Construit les messages envoyés au modèle d'extraction."""
+    return [
+        {"role": "system", "content": f"""Vous êtes un expert en extraction d'informations précises.
+        Votre tâche est d'extraire spécifiquement les informations demandées du message de l'utilisateur.
+        
+        Contexte de la conversation:
+        {conversation_context}
+        
+        Champ actuellement demandé: {current_field}"""},
+        {"role": "user", "content": user_message}
+    ]
+
+
+# Options numérotées proposées pour les champs à choix
+FIELD_OPTIONS = {
+    'situation_familiale': config.SITUATION_FAMILIALE,
+    'profession': config.PROFESSIONS,
+    'revenu_annuel': config.REVENUS,
+    'patrimoine_actuel': config.PATRIMOINE,
+    'objectifs_patrimoniaux': config.OBJECTIFS
+}
+
+
+def format_options(options: list) -> str:
+    """Formate une liste d'options pour l'affichage."""
+    return "\n".join([f"{i+1}. {opt}" for i, opt in enumerate(options)])
+
+
+def build_field_question(field: str) -> str:
+    """Retourne la question posée pour un champ, options numérotées comprises."""
+    field_prompts = {
+        'profession': f"Quelle est votre situation professionnelle actuelle ?\n{format_options(config.PROFESSIONS)}",
+        'revenu_annuel': f"Dans quelle tranche se situe votre revenu annuel ?\n{format_options(config.REVENUS)}",
+        'patrimoine_actuel': f"Dans quelle tranche se situe votre patrimoine global ?\n{format_options(config.PATRIMOINE)}",
+        'situation_familiale': f"Quelle est votre situation familiale ?\n{format_options(config.SITUATION_FAMILIALE)}",
+        'objectifs_patrimoniaux': f"Quels sont vos principaux objectifs patrimoniaux ? (plusieurs choix possibles)\n{format_options(config.OBJECTIFS)}",
+        'nom': "Pour commencer notre échange, puis-je avoir votre nom de famille ?",
+        'prenom': f"Merci. Et votre prénom ?",
+        'email': "À quelle adresse email puis-je vous envoyer nos recommandations ?",
+        'telephone': "Quel est votre numéro de téléphone pour vous recontacter ?",
+        'age': "Quel âge avez-vous ?"
+    }
+    return field_prompts.get(field, f"Pouvez-vous me communiquer votre {field} ?")
+
 
 class WealthChatbot:
-    def __init__(self, openai_client):
-        self.client = client
-        conversation_id = str(uuid.uuid4())
+    def __init__(self, openai_client, conversation_id: str = None,
+                 db: DatabaseHandler = None, retriever=None):
+        self.client = openai_client
+        conversation_id = conversation_id or str(uuid.uuid4())
         self.lead = Lead(conversation_id=conversation_id)
         self.conversation_history = []
         self.validator = DataValidator()
-        self.db = DatabaseHandler()
+        # La base et l'index peuvent être partagés entre plusieurs conversations
+        self.owns_db = db is None
+        self.db = db or DatabaseHandler()
         self.conversation_ended = False
+        self.stale = False  # une version plus récente a été enregistrée par un autre worker
+        self.returning_key = None  # (email, téléphone) normalisés déjà recherchés
+        self.speculation = None  # (empreinte du profil, future de l'analyse)
         self.MAX_MESSAGES = config.MAX_MESSAGES
         
-        # Initialize RAG components
-        self.index = faiss.read_index(config.FAISS_INDEX_PATH)
-        with open(config.METADATA_PATH, 'r', encoding='utf-8') as f:
-            self.metadata = json.load(f)
+        # Initialize RAG components (in-process index or shared retrieval service)
+        self.retriever = retriever or create_retriever()
+
+    def restore(self, lead: Lead):
+        """Reprend une conversation sauvegardée en base."""
+        self.lead = lead
+        self.conversation_history = [
+            {"role": msg["role"], "content": msg["content"]}
+            for msg in lead.conversation_history
+        ]
+        self.returning_key = self._returning_key()
+        self.conversation_ended = bool(lead.is_complete() and lead.commentaire)
 
     def _get_query_embedding(self, query: str) -> np.ndarray:
         """Generate embedding for the query using OpenAI's API"""
-        response = self.client.embeddings.create(
-            model="text-embedding-ada-002",
+        response = router.call("embeddings", self.client, lambda client, model: client.embeddings.create(
+            model=model,
             input=query
-        )
+        ))
         return np.array(response.data[0].embedding, dtype='float32').reshape(1, -1)
 
-    def _search_relevant_content(self, profile_summary: str, k: int = 3) -> list:
-        """Search for relevant content based on the user's profile"""
-        query_embedding = self._get_query_embedding(profile_summary)
-        D, I = self.index.search(query_embedding, k)
-        
-        relevant_docs = []
-        for idx in I[0]:
-            relevant_docs.append(self.metadata[idx])
-            
-        return relevant_docs
+    def _search_recommendations(self, query: str, objectifs: list = None) -> list:
+        """Return a mixed set of documents honouring config.RECOMMENDATION_QUOTAS.
+
+        The query is embedded once and all filtered searches are sent in a
+        single call: for each quota, its content type with and without the
+        user's objectives, then the objectives alone and no filter to fill the
+        remaining slots. Each search is bounded by its own size.
+        """
+        k = config.RECOMMENDATION_COUNT
+        query_embedding = self._get_query_embedding(query)
+
+        searches = []
+        for content_type, quota in config.RECOMMENDATION_QUOTAS.items():
+            searches.append({"k": quota, "filters": {"content_types": [content_type], "objectifs": objectifs}})
+            searches.append({"k": quota, "filters": {"content_types": [content_type]}})
+        searches.append({"k": k, "filters": {"objectifs": objectifs}})
+        searches.append({"k": k, "filters": None})
+        results = self.retriever.search_multi(query_embedding, searches)
+
+        # Sans document du type sur les objectifs, on garde le meilleur du type
+        candidates = []
+        for i, quota in enumerate(config.RECOMMENDATION_QUOTAS.values()):
+            candidates.append((results[2 * i] or results[2 * i + 1], quota))
+        candidates.append((results[-2] + results[-1], k))
+
+        selected, seen = [], set()
+        for docs, quota in candidates:
+            taken = 0
+            for doc in docs:
+                if taken >= quota or len(selected) >= k:
+                    break
+                if doc["index"] not in seen:
+                    seen.add(doc["index"])
+                    selected.append(doc)
+                    taken += 1
+
+        return selected
 
     def _extract_information(self, user_message: str) -> dict:
         """Extrait les informations structurées du message utilisateur."""
@@ -57,48 +178,15 @@ class WealthChatbot:
         if not missing_fields and self.lead.commentaire is None and "Avant de faire un bilan complet" in conversation_context:
             return {"commentaire": user_message}
             
-        messages = [
-            {"role": "system", "content": f"""Vous êtes un expert en extraction d'informations précises.
-            Votre tâche est d'extraire spécifiquement les informations demandées du message de l'utilisateur.
-            
-            Contexte de la conversation:
-            {conversation_context}
-            
-            Champ actuellement demandé: {current_field}"""},
-            {"role": "user", "content": user_message}
-        ]
+        messages = build_extraction_messages(conversation_context, current_field, user_message)
 
         try:
-            response = self.client.chat.completions.create(
-                model=config.OPENAI_MODEL,
+            response = router.call("extraction", self.client, lambda client, model: client.chat.completions.create(
+                model=model,
                 messages=messages,
-                functions=[{
-                    "name": "extract_lead_info",
-                    "description": "Extrait et valide les informations du prospect",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "nom": {"type": "string"},
-                            "prenom": {"type": "string"},
-                            "email": {"type": "string"},
-                            "telephone": {"type": "string"},
-                            "age": {"type": "integer"},
-                            "situation_familiale": {"type": "string"},
-                            "profession": {"type": "string"},
-                            "revenu_annuel": {"type": "number"},
-                            "patrimoine_actuel": {
-                                "type": "object",
-                                "properties": {
-                                    "montant": {"type": "number"},
-                                    "details": {"type": "string"}
-                                }
-                            },
-                            "objectifs_patrimoniaux": {"type": "array", "items": {"type": "string"}}
-                        }
-                    }
-                }],
+                functions=[EXTRACTION_FUNCTION],
                 function_call={"name": "extract_lead_info"}
-            )
+            ))
 
             if current_field in ['nom', 'prenom'] and user_message.strip().isalpha():
                 extracted_data = {current_field: user_message.strip()}
@@ -110,7 +198,49 @@ class WealthChatbot:
 
         except Exception as e:
             print(f"Error in extraction: {str(e)}")
-            return {}
+            return self._extract_locally(current_field, user_message)
+
+    def _extract_locally(self, current_field: str, user_message: str) -> dict:
+        """Extraction sans appel au modèle, utilisée quand l'API est indisponible.
+
+        Ne reconnaît que la réponse au champ demandé : email, téléphone, âge,
+        nom simple ou numéro/libellé d'une option proposée.
+        """
+        message = user_message.strip()
+        options = FIELD_OPTIONS
+        data = {}
+        if current_field in ['nom', 'prenom']:
+            if message.isalpha():
+                data[current_field] = message
+        elif current_field == 'email':
+            match = re.search(r'[\w\.-]+@[\w\.-]+\.\w+', message)
+            if match:
+                data['email'] = match.group(0)
+        elif current_field == 'telephone':
+            match = re.search(r'(\+33|0)[\d\s.-]{9,}', message)
+            if match:
+                data['telephone'] = match.group(0).strip()
+        elif current_field == 'age':
+            match = re.search(r'\b(\d{2,3})\b', message)
+            if match:
+                data['age'] = int(match.group(1))
+        elif current_field in options:
+            choices = options[current_field]
+            numbers = [int(n) for n in re.findall(r'\d+', message) if 1 <= int(n) <= len(choices)]
+            picked = [choices[n - 1] for n in numbers] or [
+                c for c in choices if normalize_string(c) == normalize_string(message)
+            ]
+            if picked:
+                if current_field == 'objectifs_patrimoniaux':
+                    data[current_field] = picked
+                elif current_field == 'patrimoine_actuel':
+                    data[current_field] = {"montant": picked[0]}
+                elif current_field == 'situation_familiale':
+                    # "Marié(e)" -> "Marié", forme attendue par le validateur
+                    data[current_field] = re.split(r'[(/]', picked[0])[0].strip()
+                else:
+                    data[current_field] = picked[0]
+        return self._validate_extracted_data(data)
 
     def _validate_extracted_data(self, extracted_data: dict) -> dict:
         """Valide les données extraites et retourne les données validées."""
@@ -154,39 +284,15 @@ class WealthChatbot:
         if not missing_fields:
             return self._generate_completion_message()
 
-        next_field = missing_fields[0]
-        field_prompts = {
-            'profession': f"Quelle est votre situation professionnelle actuelle ?\n{self._format_options(config.PROFESSIONS)}",
-            'revenu_annuel': f"Dans quelle tranche se situe votre revenu annuel ?\n{self._format_options(config.REVENUS)}",
-            'patrimoine_actuel': f"Dans quelle tranche se situe votre patrimoine global ?\n{self._format_options(config.PATRIMOINE)}",
-            'situation_familiale': f"Quelle est votre situation familiale ?\n{self._format_options(config.SITUATION_FAMILIALE)}",
-            'objectifs_patrimoniaux': f"Quels sont vos principaux objectifs patrimoniaux ? (plusieurs choix possibles)\n{self._format_options(config.OBJECTIFS)}"
-        }
-
-        return field_prompts.get(next_field, self._generate_default_question(next_field))
-
-    def _generate_default_question(self, field: str) -> str:
-        """Génère une question par défaut pour un champ donné."""
-        questions = {
-            'nom': "Pour commencer notre échange, puis-je avoir votre nom de famille ?",
-            'prenom': f"Merci. Et votre prénom ?",
-            'email': "À quelle adresse email puis-je vous envoyer nos recommandations ?",
-            'telephone': "Quel est votre numéro de téléphone pour vous recontacter ?",
-            'age': "Quel âge avez-vous ?"
-        }
-        return questions.get(field, f"Pouvez-vous me communiquer votre {field} ?")
-
-    def _format_options(self, options: list) -> str:
-        """Formate une liste d'options pour l'affichage."""
-        return "\n".join([f"{i+1}. {opt}" for i, opt in enumerate(options)])
+        return build_field_question(missing_fields[0])
 
     def _generate_completion_message(self) -> str:
         """Génère le message de conclusion avec recommandations."""
         result = self._analyze_profile()
         
-        content_recommendations = "\nRessources recommandées :"
+        content_recommendations = "\nRessources recommandées :" if result["relevant_content"] else ""
         for doc in result["relevant_content"]:
-            content_type = "📈 Simulateur" if "simulateur" in doc["title"].lower() else "📗 Guide" if "guide" in doc["title"].lower() else "📄 Article"
+            content_type = CONTENT_TYPE_LABELS[doc["content_type"]]
             content_recommendations += f"\n{content_type} : {doc['title']} \n→ {doc['url']}"
 
         return f"""Synthèse de votre situation :
@@ -200,44 +306,198 @@ class WealthChatbot:
 
     def _analyze_profile(self) -> dict:
         """Analyse le profil utilisateur et génère des recommandations."""
-        profile_summary = self._generate_profile_summary()
+        speculative = self._speculative_result()
+        if speculative is not None:
+            return self._personalize_analysis(speculative)
+
+        try:
+            return self._run_analysis(self._generate_profile_summary(), self._objectifs())
+        except Exception as e:
+            print(f"Error in profile analysis: {str(e)}")
+            return self._fallback_analysis()
+
+    def _fallback_analysis(self) -> dict:
+        """Synthèse locale quand l'analyse par le modèle est indisponible."""
+        objectifs = self._objectifs() or []
+        analysis = (
+            f"Nous avons bien noté votre situation ({self.lead.situation_familiale}, "
+            f"{self.lead.profession}) et votre patrimoine ({self.lead.patrimoine_actuel})."
+        )
+        if objectifs:
+            analysis += f" Vos priorités : {', '.join(objectifs).lower()}."
+        analysis += " Un conseiller préparera une analyse détaillée de votre profil."
+        return {
+            "analysis": analysis,
+            "relevant_content": []
+        }
+
+    def _run_analysis(self, profile_summary: str, objectifs: list = None) -> dict:
+        """Appelle le modèle d'analyse puis recherche les contenus associés.
+
+        Ne lit pas self.lead : peut s'exécuter dans un thread de speculation_pool.
+        """
+        response = router.call("analysis", self.client, lambda client, model: client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": "Vous êtes un expert en gestion de patrimoine."},
+                {"role": "user", "content": profile_summary}
+            ]
+        ))
+        
+        analysis = response.choices[0].message.content
+        try:
+            relevant_docs = self._search_recommendations(analysis, objectifs)
+        except Exception as e:
+            # L'analyse reste utile sans les recommandations de contenus
+            print(f"Error in content search: {str(e)}")
+            relevant_docs = []
         
+        return {
+            "analysis": analysis,
+            "relevant_content": relevant_docs
+        }
+
+    def _objectifs(self) -> list:
+        return self.lead.objectifs_patrimoniaux if isinstance(self.lead.objectifs_patrimoniaux, list) else None
+
+    def _profile_fingerprint(self) -> str:
+        """Empreinte des champs requis, pour savoir si une analyse anticipée est encore valable."""
+        return json.dumps([getattr(self.lead, f) for f in Lead.REQUIRED_FIELDS], default=str)
+
+    def _start_speculative_analysis(self):
+        """Lance l'analyse de base dès que le profil est complet, sans attendre le commentaire.
+
+        Si une réponse précédente a été modifiée, l'analyse en cours est abandonnée
+        et relancée sur le nouveau profil.
+        """
+        if not config.SPECULATIVE_ANALYSIS:
+            return
+        fingerprint = self._profile_fingerprint()
+        if self.speculation and self.speculation[0] == fingerprint:
+            return
+        self.cancel_speculation()
+        future = speculation_pool.submit(
+            self._run_analysis,
+            self._generate_profile_summary(include_comment=False),
+            self._objectifs()
+        )
+        self.speculation = (fingerprint, future)
+
+    def cancel_speculation(self):
+        """Abandonne l'analyse anticipée (son résultat sera ignoré si elle a déjà démarré)."""
+        if self.speculation:
+            self.speculation[1].cancel()
+            self.speculation = None
+
+    def _speculative_result(self):
+        """Retourne l'analyse anticipée si elle correspond toujours au profil, sinon None."""
+        if not self.speculation:
+            return None
+        fingerprint, future = self.speculation
+        self.speculation = None
+        if fingerprint != self._profile_fingerprint():
+            future.cancel()
+            return None
+        try:
+            return future.result(timeout=config.SPECULATIVE_WAIT)
+        except FutureTimeoutError:
+            if future.cancel():
+                # Encore en file d'attente : l'analyse complète démarre tout de suite
+                print("Speculative analysis still queued, running the full analysis")
+                return None
+        except Exception as e:
+            print(f"Speculative analysis unavailable: {str(e)}")
+            return None
+        # Déjà en cours : l'attendre n'est jamais plus lent que recommencer.
+        # Ses appels sont bornés par les délais des étapes analysis et embeddings.
         try:
-            response = self.client.chat.completions.create(
-                model=config.OPENAI_MODEL,
+            return future.result(timeout=config.STAGE_TIMEOUTS["analysis"] + config.STAGE_TIMEOUTS["embeddings"])
+        except Exception as e:
+            print(f"Speculative analysis unavailable: {type(e).__name__} {str(e)}")
+            return None
+
+    def _personalize_analysis(self, base: dict) -> dict:
+        """Adapte brièvement l'analyse de base au commentaire de l'utilisateur."""
+        if not self.lead.commentaire:
+            return base
+        try:
+            response = router.call("personalization", self.client, lambda client, model: client.chat.completions.create(
+                model=model,
                 messages=[
                     {"role": "system", "content": "Vous êtes un expert en gestion de patrimoine."},
-                    {"role": "user", "content": profile_summary}
+                    {"role": "user", "content": f"""Voici une analyse patrimoniale :
+                    {base['analysis']}
+                    
+                    Le client ajoute : {self.lead.commentaire}
+                    
+                    Reprenez cette analyse en répondant à ses attentes, de façon concise."""}
                 ]
-            )
-            
+            ))
             analysis = response.choices[0].message.content
-            relevant_docs = self._search_relevant_content(analysis)
-            
-            return {
-                "analysis": analysis,
-                "relevant_content": relevant_docs
-            }
         except Exception as e:
-            print(f"Error in profile analysis: {str(e)}")
-            return {
-                "analysis": "Une erreur est survenue lors de l'analyse.",
-                "relevant_content": []
-            }
+            print(f"Error in analysis personalization: {str(e)}")
+            analysis = base["analysis"]
+        return {
+            "analysis": analysis,
+            "relevant_content": base["relevant_content"]
+        }
 
-    def _generate_profile_summary(self) -> str:
+    def _generate_profile_summary(self, include_comment: bool = True) -> str:
         """Génère un résumé du profil pour l'analyse."""
+        commentaire = f"\n        - Commentaire: {self.lead.commentaire}" if include_comment else ""
         return f"""Analysez ce profil :
         - Âge: {self.lead.age} ans
         - Situation: {self.lead.situation_familiale}
         - Profession: {self.lead.profession}
         - Revenu: {self.lead.revenu_annuel}
         - Patrimoine: {self.lead.patrimoine_actuel}
-        - Objectifs: {', '.join(self.lead.objectifs_patrimoniaux) if isinstance(self.lead.objectifs_patrimoniaux, list) else self.lead.objectifs_patrimoniaux}
-        - Commentaire: {self.lead.commentaire}
+        - Objectifs: {', '.join(self.lead.objectifs_patrimoniaux) if isinstance(self.lead.objectifs_patrimoniaux, list) else self.lead.objectifs_patrimoniaux}{commentaire}
         
         Fournissez une analyse concise avec des recommandations personnalisées."""
 
+    def _returning_key(self):
+        return (normalize_email(self.lead.email), normalize_phone(self.lead.telephone))
+
+    def _prefill_from_returning_visitor(self) -> bool:
+        """Complète le lead avec les réponses encore valables d'un prospect déjà connu.
+
+        La recherche demande l'email et le téléphone : un seul identifiant ne
+        prouve pas qu'il s'agit de la même personne. Elle est refaite si l'un
+        d'eux change. Les données d'identité (Lead.IDENTITY_FIELDS) ne sont
+        jamais reprises, et les champs plus anciens que
+        config.LEAD_FIELD_MAX_AGE_DAYS seront redemandés.
+        """
+        key = self._returning_key()
+        if not all(key) or key == self.returning_key:
+            return False
+        self.returning_key = key
+
+        found = self.db.find_returning_lead(self.lead.email, self.lead.telephone, self.lead.conversation_id)
+        if not found:
+            return False
+        previous, last_seen = found
+
+        try:
+            days = (datetime.now() - datetime.fromisoformat(str(last_seen))).days
+        except ValueError:
+            days = None
+
+        prefilled = False
+        for field in self.lead.get_missing_fields():
+            if field in Lead.IDENTITY_FIELDS:
+                continue
+            value = getattr(previous, field)
+            if value is None:
+                continue
+            max_age = config.LEAD_FIELD_MAX_AGE_DAYS.get(field)
+            if max_age is not None and (days is None or days > max_age):
+                continue
+            if field == 'age' and days:
+                value += days // 365
+            setattr(self.lead, field, value)
+            prefilled = True
+        return prefilled
+
     def process_message(self, user_message: str) -> str:
         """Traite un message utilisateur et retourne la réponse du chatbot."""
         # Vérification du nombre maximum de messages
@@ -264,16 +524,15 @@ class WealthChatbot:
                 setattr(self.lead, key, value)
                 info_updated = True
 
-        try:
-            self.db.save_lead(self.lead)
-        except Exception as e:
-            print(f"Warning: Could not save to database: {str(e)}")
+        # Reprise des réponses d'un prospect déjà connu
+        prefilled = self._prefill_from_returning_visitor()
 
         # Génération de la réponse appropriée
         if not info_updated:
             response = self._generate_next_question()
         elif self.lead.is_complete():
             if not self.lead.commentaire:
+                self._start_speculative_analysis()
                 response = """
                 Merci pour toutes ces informations. Avant de faire un bilan complet,
                 pourriez-vous me décrire brièvement vos attentes ou questions particulières ?
@@ -284,6 +543,9 @@ class WealthChatbot:
         else:
             response = self._generate_next_question()
 
+        if prefilled:
+            response = f"Ravi de vous revoir ! J'ai repris les informations de notre précédent échange.\n\n{response}"
+
         # Ajout de la réponse à l'historique
         bot_response = {
             "timestamp": datetime.now().isoformat(),
@@ -293,9 +555,18 @@ class WealthChatbot:
         self.lead.conversation_history.append(bot_response)
         self.conversation_history.append({"role": "assistant", "content": response})
 
+        # Sauvegarde après la réponse : un autre worker peut reprendre la conversation
+        try:
+            self.db.save_lead(self.lead)
+        except StaleLeadError as e:
+            print(f"Warning: {str(e)}")
+            self.stale = True
+        except Exception as e:
+            print(f"Warning: Could not save to database: {str(e)}")
+
         return response
 
     def __del__(self):
         """Destructeur pour assurer la fermeture de la connexion à la base de données."""
-        if hasattr(self, 'db'):
+        if getattr(self, 'owns_db', False):
             self.db.close()
@@ -0,0 +1,91 @@
+import time
+import uuid
+import threading
+from typing import Dict, Optional
+from config import config
+from .models import DatabaseHandler
+from .chat_handler import WealthChatbot
+from .retrieval import create_retriever
+
+
+class _Conversation:
+    """État d'une conversation en mémoire et verrou qui sérialise ses messages."""
+
+    def __init__(self, chatbot: WealthChatbot):
+        self.chatbot = chatbot
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+
+class ConversationManager:
+    """Associe chaque conversation_id à son propre chatbot.
+
+    Les messages d'une même conversation sont traités l'un après l'autre,
+    ceux de conversations différentes en parallèle (workers gthread). La
+    base de données, l'index et le client OpenAI sont partagés.
+    """
+
+    def __init__(self, openai_client, db: DatabaseHandler = None, retriever=None):
+        self.client = openai_client
+        self.db = db or DatabaseHandler()
+        self.retriever = retriever or create_retriever()
+        self.conversations: Dict[str, _Conversation] = {}
+        self.lock = threading.Lock()
+
+    def _load(self, conversation_id: str) -> WealthChatbot:
+        chatbot = WealthChatbot(self.client, conversation_id, db=self.db, retriever=self.retriever)
+        lead = self.db.get_lead(conversation_id)
+        if lead:
+            chatbot.restore(lead)
+        return chatbot
+
+    def _refresh(self, conversation_id: str, conversation: _Conversation):
+        """Recharge la conversation si un autre worker l'a fait avancer depuis (appelé avec son verrou).
+
+        Le verrou de conversation ne protège qu'à l'intérieur d'un processus :
+        avec plusieurs workers, les messages suivants peuvent arriver ailleurs.
+        """
+        stored = self.db.get_message_count(conversation_id)
+        if conversation.chatbot.stale or (stored is not None and stored > conversation.chatbot.lead.message_count):
+            conversation.chatbot.cancel_speculation()
+            conversation.chatbot = self._load(conversation_id)
+
+    def _evict_idle(self, now: float):
+        expired = [cid for cid, conv in self.conversations.items()
+                   if now - conv.last_used > config.CONVERSATION_TTL and not conv.lock.locked()]
+        for cid in expired:
+            self.conversations.pop(cid).chatbot.cancel_speculation()
+
+    def get(self, conversation_id: str) -> _Conversation:
+        """Retourne la conversation, en la rechargeant depuis la base si besoin."""
+        now = time.monotonic()
+        with self.lock:
+            self._evict_idle(now)
+            conversation = self.conversations.get(conversation_id)
+            if conversation is None:
+                conversation = _Conversation(self._load(conversation_id))
+                self.conversations[conversation_id] = conversation
+            conversation.last_used = now
+            return conversation
+
+    def process_message(self, conversation_id: Optional[str], message: str) -> tuple:
+        """Traite un message et retourne (conversation_id, réponse)."""
+        conversation_id = conversation_id or str(uuid.uuid4())
+        conversation = self.get(conversation_id)
+        with conversation.lock:
+            for _ in range(config.CONVERSATION_SAVE_ATTEMPTS):
+                self._refresh(conversation_id, conversation)
+                response = conversation.chatbot.process_message(message)
+                if not conversation.chatbot.stale:
+                    break
+                # Un autre worker a traité un message en même temps : on rejoue
+                # celui-ci sur la version enregistrée plutôt que de l'écraser
+            conversation.last_used = time.monotonic()
+        return conversation_id, response
+
+    def end(self, conversation_id: str):
+        """Libère la conversation de la mémoire du worker et abandonne son analyse anticipée."""
+        with self.lock:
+            conversation = self.conversations.pop(conversation_id, None)
+        if conversation is not None:
+            conversation.chatbot.cancel_speculation()
@@ -0,0 +1,181 @@
+"""Facettes des documents indexés (type de contenu, section, objectifs).
+
+embeddings_db/facets.npz est versionné avec l'index : après chaque
+reconstruction de faiss_index.idx / metadata.json, le régénérer avec
+    python -m app.facets
+Sinon chaque worker les recalcule au démarrage.
+"""
+import os
+import json
+import hashlib
+from typing import Optional, List, Dict
+from urllib.parse import urlparse
+import numpy as np
+from config import config
+from .untils import normalize_string
+
+# Types de contenu, dans l'ordre de leur code entier
+CONTENT_TYPES = ["article", "guide", "simulateur"]
+
+CONTENT_TYPE_LABELS = {
+    "article": "📄 Article",
+    "guide": "📗 Guide",
+    "simulateur": "📈 Simulateur"
+}
+
+# Mots-clés (normalisés) associés à chaque objectif patrimonial
+OBJECTIF_KEYWORDS = {
+    "Obtenir des revenus complémentaires": ["revenu", "rente", "dividende", "loyer", "scpi"],
+    "Investir en immobilier": ["immobilier", "scpi", "lmnp", "pinel", "locatif"],
+    "Développer mon patrimoine": ["placement", "investir", "investissement", "assurance-vie", "assurance vie", "bourse"],
+    "Réduire mes impôts": ["impot", "fiscal", "defiscalisation", "girardin", "fortune immobiliere", "niche"],
+    "Préparer ma retraite": ["retraite", "plan epargne retraite", "madelin"],
+    "Protéger ma famille": ["prevoyance", "deces", "conjoint", "enfant", "matrimonial", "protection"],
+    "Transmettre mon patrimoine": ["succession", "donation", "transmission", "heritage", "demembrement"],
+    "Placer ma trésorerie excédentaire": ["tresorerie", "holding", "societe", "entreprise"]
+}
+
+# Sections d'URL rattachées directement à un objectif
+OBJECTIF_SECTIONS = {
+    "immobilier": "Investir en immobilier",
+    "fiscalite": "Réduire mes impôts",
+    "retraite": "Préparer ma retraite",
+    "prevoyance": "Protéger ma famille",
+    "famille": "Protéger ma famille",
+    "financier": "Développer mon patrimoine",
+    "entreprise": "Placer ma trésorerie excédentaire",
+    "societe": "Placer ma trésorerie excédentaire"
+}
+
+
+def classify_content_type(doc: dict) -> str:
+    """Détermine le type de contenu d'un document (article, guide ou simulateur)."""
+    title = doc.get("title", "").lower()
+    path = urlparse(doc.get("url", "")).path.lower()
+    if "simulateur" in title or "/simulateurs/" in path:
+        return "simulateur"
+    if "guide" in title:
+        return "guide"
+    return "article"
+
+
+def extract_section(doc: dict) -> str:
+    """Retourne la première partie du chemin de l'URL (ex: 'immobilier')."""
+    parts = [p for p in urlparse(doc.get("url", "")).path.split("/") if p]
+    if len(parts) > 1:
+        return parts[0]
+    return "autre"
+
+
+def objectif_mask(objectifs: List[str]) -> int:
+    """Convertit une liste d'objectifs en masque de bits."""
+    mask = 0
+    for objectif in objectifs or []:
+        if objectif in config.OBJECTIFS:
+            mask |= 1 << config.OBJECTIFS.index(objectif)
+    return mask
+
+
+def tag_objectifs(doc: dict, section: str) -> int:
+    """Calcule le masque des objectifs couverts par un document."""
+    text = normalize_string(f"{doc.get('title', '')} {doc.get('url', '')}")
+    tags = []
+    if section in OBJECTIF_SECTIONS:
+        tags.append(OBJECTIF_SECTIONS[section])
+    for objectif, keywords in OBJECTIF_KEYWORDS.items():
+        if any(keyword in text for keyword in keywords):
+            tags.append(objectif)
+    return objectif_mask(tags)
+
+
+def metadata_hash(metadata: List[dict]) -> str:
+    """Empreinte des métadonnées, pour détecter des facettes calculées sur un autre index."""
+    return hashlib.sha256(json.dumps(metadata, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def build_facets(metadata: List[dict]) -> Dict[str, np.ndarray]:
+    """Précalcule les facettes de chaque document sous forme de tableaux entiers.
+
+    Les positions dans les tableaux correspondent aux identifiants FAISS.
+    """
+    sections = sorted({extract_section(doc) for doc in metadata})
+    section_codes = {name: code for code, name in enumerate(sections)}
+
+    content_type = np.empty(len(metadata), dtype=np.uint8)
+    section = np.empty(len(metadata), dtype=np.uint8)
+    objectifs = np.empty(len(metadata), dtype=np.uint16)
+
+    for i, doc in enumerate(metadata):
+        doc_section = extract_section(doc)
+        content_type[i] = CONTENT_TYPES.index(classify_content_type(doc))
+        section[i] = section_codes[doc_section]
+        objectifs[i] = tag_objectifs(doc, doc_section)
+
+    return {
+        "content_type": content_type,
+        "section": section,
+        "objectifs": objectifs,
+        "sections": np.array(sections),
+        "metadata_hash": np.array(metadata_hash(metadata))
+    }
+
+
+def save_facets(facets: Dict[str, np.ndarray], path: str = None):
+    """Sauvegarde les facettes au format npz."""
+    np.savez_compressed(path or config.FACETS_PATH, **facets)
+
+
+class FacetIndex:
+    """Facettes précalculées des documents indexés, utilisées comme filtres de recherche."""
+
+    def __init__(self, metadata: List[dict], path: str = None):
+        path = path or config.FACETS_PATH
+        facets = None
+        if os.path.exists(path):
+            with np.load(path) as data:
+                facets = {key: data[key] for key in data.files}
+            if "metadata_hash" not in facets or str(facets["metadata_hash"]) != metadata_hash(metadata):
+                print("Warning: facets out of date, rebuilding from metadata (run python -m app.facets)")
+                facets = None
+        if facets is None:
+            facets = build_facets(metadata)
+
+        self.content_type = facets["content_type"]
+        self.section = facets["section"]
+        self.objectifs = facets["objectifs"]
+        self.sections = [str(s) for s in facets["sections"]]
+
+    def content_type_of(self, idx: int) -> str:
+        """Retourne le type de contenu d'un document."""
+        return CONTENT_TYPES[self.content_type[idx]]
+
+    def select(self, content_types: Optional[List[str]] = None,
+               sections: Optional[List[str]] = None,
+               objectifs: Optional[List[str]] = None,
+               exclude: Optional[List[int]] = None) -> np.ndarray:
+        """Retourne les identifiants des documents correspondant aux filtres."""
+        mask = np.ones(len(self.content_type), dtype=bool)
+        if content_types:
+            codes = [CONTENT_TYPES.index(t) for t in content_types if t in CONTENT_TYPES]
+            mask &= np.isin(self.content_type, codes)
+        if sections:
+            codes = [self.sections.index(s) for s in sections if s in self.sections]
+            mask &= np.isin(self.section, codes)
+        if objectifs:
+            wanted = objectif_mask(objectifs)
+            if wanted:
+                mask &= (self.objectifs & wanted) != 0
+        if exclude:
+            mask[list(exclude)] = False
+        return np.flatnonzero(mask).astype('int64')
+
+
+if __name__ == "__main__":
+    with open(config.METADATA_PATH, 'r', encoding='utf-8') as f:
+        metadata = json.load(f)
+    facets = build_facets(metadata)
+    save_facets(facets)
+    counts = np.bincount(facets["content_type"], minlength=len(CONTENT_TYPES))
+    print(f"Facettes sauvegardées dans {config.FACETS_PATH}")
+    for name, count in zip(CONTENT_TYPES, counts):
+        print(f"  {name}: {count}")
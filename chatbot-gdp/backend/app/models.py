@@ -1,11 +1,18 @@
 from config import config
-from app import app_instance
 import sqlite3
+import threading
 import json
-from dataclasses import dataclass, asdict, field
-from typing import Optional, List, Dict
+from dataclasses import dataclass, asdict, field, fields
+from typing import Optional, List, Dict, Tuple
 from datetime import datetime
 from config import config
+from .untils import normalize_email, normalize_phone
+from .analytics import (STATS_COLUMNS, create_stats_table, contributions, apply_delta,
+                        query_stats, needs_backfill, backfill)
+
+class StaleLeadError(Exception):
+    """Levée quand un autre worker a déjà enregistré une version plus récente du lead."""
+
 
 @dataclass
 class Lead:
@@ -27,23 +34,22 @@ class Lead:
     conversation_history: List[Dict[str, str]] = field(default_factory=list)
     message_count: int = field(default=0)
 
+    REQUIRED_FIELDS = [
+        'nom', 'prenom', 'email', 'telephone', 'age', 
+        'situation_familiale', 'profession', 'revenu_annuel', 
+        'patrimoine_actuel', 'objectifs_patrimoniaux'
+    ]
+
+    # Données d'identité : jamais reprises d'un autre lead
+    IDENTITY_FIELDS = ['nom', 'prenom', 'email', 'telephone']
+
     def is_complete(self) -> bool:
         """Vérifie si toutes les informations requises ont été collectées."""
-        required_fields = [
-            'nom', 'prenom', 'email', 'telephone', 'age', 
-            'situation_familiale', 'profession', 'revenu_annuel', 
-            'patrimoine_actuel', 'objectifs_patrimoniaux'
-        ]
-        return all(getattr(self, field) is not None for field in required_fields)
+        return all(getattr(self, field) is not None for field in self.REQUIRED_FIELDS)
 
     def get_missing_fields(self) -> List[str]:
         """Retourne la liste des champs manquants dans l'ordre de priorité."""
-        required_fields = [
-            'nom', 'prenom', 'email', 'telephone', 'age', 
-            'situation_familiale', 'profession', 'revenu_annuel', 
-            'patrimoine_actuel', 'objectifs_patrimoniaux'
-        ]
-        return [field for field in required_fields if getattr(self, field) is None]
+        return [field for field in self.REQUIRED_FIELDS if getattr(self, field) is None]
 
     def to_dict(self) -> dict:
         """Convertit l'instance en dictionnaire pour la sauvegarde."""
@@ -78,9 +84,30 @@ class DatabaseHandler:
     """Gère les interactions avec la base de données SQLite."""
     
     def __init__(self):
-        """Initialise la connexion à la base de données."""
-        self.conn = sqlite3.connect(config.DATABASE_PATH)
+        """Initialise la base de données.
+
+        Chaque thread utilise sa propre connexion SQLite, ce qui permet de
+        partager une même instance entre les threads d'un worker gthread.
+        """
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
         self.create_tables()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Retourne la connexion du thread courant, créée à la première utilisation."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # check_same_thread=False uniquement pour permettre close() depuis un autre thread
+            conn = sqlite3.connect(config.DATABASE_PATH, timeout=config.DATABASE_TIMEOUT,
+                                   check_same_thread=False)
+            # WAL : les lectures ne bloquent pas pendant l'écriture d'un autre thread
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
         
     def create_tables(self):
         """Crée la table des leads si elle n'existe pas."""
@@ -102,27 +129,87 @@ class DatabaseHandler:
             commentaire TEXT,
             conversation_history TEXT,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            message_count INTEGER DEFAULT 0
+            message_count INTEGER DEFAULT 0,
+            updated_at TIMESTAMP,
+            email_normalized TEXT,
+            telephone_normalized TEXT
         )
         ''')
+        self._migrate_columns(cursor)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_leads_email_normalized ON leads(email_normalized)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_leads_telephone_normalized ON leads(telephone_normalized)")
+        create_stats_table(cursor)
         self.conn.commit()
+        if needs_backfill(cursor):
+            # Compteurs écrits avant le regroupement des montants en tranches
+            backfill(self)
 
-    def _lead_exists(self, conversation_id: str) -> bool:
-        """Vérifie si un lead existe déjà avec cet ID de conversation."""
-        cursor = self.conn.cursor()
+    def _migrate_columns(self, cursor):
+        """Ajoute les colonnes absentes des bases créées par une version antérieure."""
+        cursor.execute("PRAGMA table_info(leads)")
+        existing = {row[1] for row in cursor.fetchall()}
+        columns = {
+            'message_count': 'INTEGER DEFAULT 0',
+            'updated_at': 'TIMESTAMP',
+            'email_normalized': 'TEXT',
+            'telephone_normalized': 'TEXT'
+        }
+        for name, column_type in columns.items():
+            if name not in existing:
+                cursor.execute(f"ALTER TABLE leads ADD COLUMN {name} {column_type}")
+
+        if 'email_normalized' not in existing or 'telephone_normalized' not in existing:
+            # Renseigne les identifiants normalisés des leads existants
+            cursor.execute("SELECT id, email, telephone FROM leads")
+            rows = cursor.fetchall()
+            cursor.executemany(
+                "UPDATE leads SET email_normalized = ?, telephone_normalized = ? WHERE id = ?",
+                [(normalize_email(email), normalize_phone(phone), lead_id) for lead_id, email, phone in rows]
+            )
+
+    def _message_count(self, cursor, conversation_id: str) -> Optional[int]:
+        cursor.execute("SELECT message_count FROM leads WHERE conversation_id = ?", (conversation_id,))
+        row = cursor.fetchone()
+        return (row[0] or 0) if row else None
+
+    def get_message_count(self, conversation_id: str) -> Optional[int]:
+        """Retourne le nombre de messages enregistrés pour une conversation (None si absente)."""
+        return self._message_count(self.conn.cursor(), conversation_id)
+
+    def _stats_row(self, cursor, conversation_id: str) -> Optional[dict]:
+        """Retourne les colonnes agrégées du lead existant, ou None s'il n'existe pas."""
         cursor.execute(
-            "SELECT 1 FROM leads WHERE conversation_id = ? LIMIT 1", 
+            f"SELECT {', '.join(STATS_COLUMNS)} FROM leads WHERE conversation_id = ? LIMIT 1",
             (conversation_id,)
         )
-        return cursor.fetchone() is not None
+        row = cursor.fetchone()
+        return dict(zip(STATS_COLUMNS, row)) if row else None
     
     def save_lead(self, lead: Lead) -> bool:
-        """Sauvegarde ou met à jour un lead dans la base de données."""
+        """Sauvegarde ou met à jour un lead dans la base de données.
+
+        Raises:
+            StaleLeadError: si la base contient déjà une version au moins aussi
+                avancée (message_count), écrite par un autre worker
+        """
         try:
             cursor = self.conn.cursor()
+            if lead.created_at is None:
+                lead.created_at = datetime.now().isoformat(sep=' ', timespec='seconds')
             data = lead.to_dict()
+            data['updated_at'] = datetime.now().isoformat(sep=' ', timespec='seconds')
+            data['email_normalized'] = normalize_email(lead.email)
+            data['telephone_normalized'] = normalize_phone(lead.telephone)
+            
+            # Verrou d'écriture dès la lecture : l'ancien état et les compteurs restent cohérents
+            cursor.execute("BEGIN IMMEDIATE")
+            stored_count = self._message_count(cursor, lead.conversation_id)
+            if stored_count is not None and stored_count >= lead.message_count:
+                raise StaleLeadError(f"Lead {lead.conversation_id} not saved: stale copy "
+                                     f"({lead.message_count} messages, {stored_count} in database)")
+            previous = self._stats_row(cursor, lead.conversation_id)
             
-            if self._lead_exists(lead.conversation_id):
+            if previous is not None:
                 # Mise à jour d'un enregistrement existant
                 fields = [f"{k} = ?" for k in data.keys() if k != 'id']
                 values = [v for k, v in data.items() if k != 'id']
@@ -145,9 +232,18 @@ class DatabaseHandler:
                 VALUES ({", ".join(placeholders)})
                 ''', values)
             
+            # Mise à jour incrémentale des statistiques dans la même transaction
+            current = {k: getattr(lead, k) for k in STATS_COLUMNS}
+            apply_delta(cursor,
+                        contributions(previous, Lead.REQUIRED_FIELDS),
+                        contributions(current, Lead.REQUIRED_FIELDS))
+            
             self.conn.commit()
             return True
             
+        except StaleLeadError:
+            self.conn.rollback()
+            raise
         except Exception as e:
             print(f"Erreur lors de la sauvegarde du lead: {str(e)}")
             self.conn.rollback()
@@ -164,16 +260,60 @@ class DatabaseHandler:
         row = cursor.fetchone()
         if row:
             # Convertit le résultat en dictionnaire
-            columns = [description[0] for description in cursor.description]
-            data = dict(zip(columns, row))
-            return Lead.from_dict(data)
+            return self._row_to_lead(cursor, row)
         return None
 
+    def _row_to_lead(self, cursor, row) -> Lead:
+        """Convertit une ligne de la table leads en Lead (hors colonnes techniques)."""
+        columns = [description[0] for description in cursor.description]
+        lead_fields = {f.name for f in fields(Lead)}
+        data = {k: v for k, v in zip(columns, row) if k in lead_fields}
+        return Lead.from_dict(data)
+
+    def get_lead_stats(self, dimension: str, granularity: str = "month",
+                       start: Optional[str] = None, end: Optional[str] = None) -> List[dict]:
+        """Retourne les compteurs pré-agrégés d'une dimension (voir analytics.query_stats)."""
+        return query_stats(self.conn.cursor(), dimension, granularity, start, end)
+
+    def find_returning_lead(self, email: Optional[str], telephone: Optional[str],
+                            exclude_conversation_id: Optional[str] = None) -> Optional[Tuple[Lead, Optional[str]]]:
+        """Recherche le lead le plus récent ayant à la fois le même email et le même téléphone normalisés.
+
+        Un seul identifiant ne suffit pas : il permettrait à un tiers de récupérer
+        les réponses d'un autre prospect.
+
+        Returns:
+            Optional[Tuple[Lead, Optional[str]]]: (lead, date_de_dernière_mise_à_jour)
+        """
+        email_key = normalize_email(email)
+        phone_key = normalize_phone(telephone)
+        if not email_key or not phone_key:
+            return None
+
+        query = "SELECT * FROM leads WHERE email_normalized = ? AND telephone_normalized = ?"
+        params = [email_key, phone_key]
+        if exclude_conversation_id:
+            query += " AND conversation_id != ?"
+            params.append(exclude_conversation_id)
+        query += " ORDER BY COALESCE(updated_at, created_at) DESC LIMIT 1"
+
+        cursor = self.conn.cursor()
+        cursor.execute(query, params)
+        row = cursor.fetchone()
+        if not row:
+            return None
+        columns = [description[0] for description in cursor.description]
+        record = dict(zip(columns, row))
+        return self._row_to_lead(cursor, row), record.get('updated_at') or record.get('created_at')
+
     def close(self):
-        """Ferme la connexion à la base de données."""
-        if self.conn:
-            self.conn.close()
+        """Ferme toutes les connexions ouvertes par les différents threads."""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
 
     def __del__(self):
-        """Assure la fermeture de la connexion lors de la destruction de l'instance."""
-        self.close()
\ No newline at end of file
+        """Assure la fermeture des connexions lors de la destruction de l'instance."""
+        if hasattr(self, '_connections_lock'):
+            self.close()
\ No newline at end of file
@@ -0,0 +1,231 @@
+import os
+import time
+import uuid
+import cProfile
+import pstats
+import resource
+import threading
+import tracemalloc
+from collections import OrderedDict
+from typing import Optional
+from flask import g, request
+from config import config
+from .auth import is_admin_request
+
+
+def _current_rss_kb() -> Optional[int]:
+    """Mémoire résidente actuelle du processus (Linux), None si indisponible."""
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return resident_pages * os.sysconf('SC_PAGE_SIZE') // 1024
+
+
+def _top_functions(stats: pstats.Stats, limit: int) -> list:
+    """Fonctions les plus coûteuses (temps cumulé) d'un profil cProfile."""
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+    return [
+        {
+            "function": f"{filename}:{line}({name})",
+            "calls": nc,
+            "total_time": round(tt, 6),
+            "cumulative_time": round(ct, 6)
+        }
+        for (filename, line, name), (cc, nc, tt, ct, callers) in rows
+    ]
+
+
+# Allocations du profileur lui-même (fusion des profils, instantanés), exclues des rapports
+PROFILER_FILTERS = [
+    tracemalloc.Filter(False, module.__file__)
+    for module in (cProfile, pstats, tracemalloc)
+] + [tracemalloc.Filter(False, __file__)]
+
+
+def _top_allocations(snapshot: tracemalloc.Snapshot, baseline: Optional[tracemalloc.Snapshot], limit: int) -> list:
+    """Sites d'allocation ayant le plus grossi depuis le début de la session."""
+    snapshot = snapshot.filter_traces(PROFILER_FILTERS)
+    if baseline is not None:
+        baseline = baseline.filter_traces(PROFILER_FILTERS)
+        stats = snapshot.compare_to(baseline, 'lineno')
+    else:
+        stats = snapshot.statistics('lineno')
+    return [
+        {
+            "location": str(stat.traceback[0]),
+            "size_kb": round(stat.size / 1024, 1),
+            "size_diff_kb": round(getattr(stat, 'size_diff', stat.size) / 1024, 1),
+            "count": stat.count
+        }
+        for stat in stats[:limit]
+    ]
+
+
+class WorkerProfiler:
+    """Profilage à la demande du worker courant.
+
+    Une session profile les N prochaines requêtes reçues par ce processus
+    (cProfile par requête, fusionné) et peut suivre les allocations avec
+    tracemalloc. Hors session, les hooks se limitent à un test de booléen.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = False
+        self.remaining = 0
+        self.inflight = 0
+        self.stats = None
+        self.memory = False
+        self.owns_tracing = False
+        self.baseline = None
+        self.started_at = None
+        self.profiled = 0
+        self.last_report = None
+        self.request_reports = OrderedDict()
+
+    def start(self, requests: int, memory: bool = False) -> dict:
+        with self.lock:
+            if self.active:
+                raise ValueError("A profiling session is already running in this worker")
+            if not 1 <= requests <= config.PROFILE_MAX_REQUESTS:
+                raise ValueError(f"'requests' must be between 1 and {config.PROFILE_MAX_REQUESTS}")
+            self.remaining = requests
+            self.stats = None
+            self.profiled = 0
+            self.memory = memory
+            self.started_at = time.time()
+            if memory:
+                # Un suivi déjà actif (ex: PYTHONTRACEMALLOC) n'est pas arrêté en fin de session
+                self.owns_tracing = not tracemalloc.is_tracing()
+                if self.owns_tracing:
+                    tracemalloc.start(config.PROFILE_TRACEMALLOC_FRAMES)
+                self.baseline = tracemalloc.take_snapshot()
+            self.active = True
+        return self.status()
+
+    def stop(self) -> dict:
+        with self.lock:
+            if self.active:
+                self._finish()
+            return self.last_report
+
+    def _finish(self):
+        """Construit le rapport de la session (appelé avec self.lock)."""
+        report = {
+            "pid": os.getpid(),
+            "started_at": self.started_at,
+            "duration": round(time.time() - self.started_at, 3),
+            "requests": self.profiled,
+            "rss_kb": _current_rss_kb(),
+            "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "functions": _top_functions(self.stats, config.PROFILE_TOP) if self.stats else []
+        }
+        if self.memory and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            report["allocations"] = _top_allocations(snapshot, self.baseline, config.PROFILE_TOP)
+            report["traced_memory_kb"] = round(tracemalloc.get_traced_memory()[0] / 1024, 1)
+            if self.owns_tracing:
+                tracemalloc.stop()
+        self.owns_tracing = False
+        self.active = False
+        self.remaining = 0
+        self.inflight = 0
+        self.stats = None
+        self.baseline = None
+        self.last_report = report
+
+    def status(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "active": self.active,
+            "remaining": self.remaining,
+            "profiled": self.profiled,
+            "memory": self.memory
+        }
+
+    def claim(self) -> bool:
+        """Réserve une des requêtes restantes de la session."""
+        with self.lock:
+            if not self.active or self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            self.inflight += 1
+            return True
+
+    def record(self, profile: cProfile.Profile):
+        """Fusionne le profil d'une requête dans la session."""
+        with self.lock:
+            self.inflight = max(self.inflight - 1, 0)
+            if not self.active:
+                return
+            if self.stats is None:
+                self.stats = pstats.Stats(profile)
+            else:
+                self.stats.add(profile)
+            self.profiled += 1
+            if self.remaining <= 0 and self.inflight == 0:
+                self._finish()
+
+    def record_request(self, profile: cProfile.Profile) -> str:
+        """Conserve le profil d'une requête isolée (en-tête X-Profile) et retourne son identifiant."""
+        report_id = uuid.uuid4().hex
+        report = {
+            "pid": os.getpid(),
+            "path": request.path,
+            "functions": _top_functions(pstats.Stats(profile), config.PROFILE_TOP)
+        }
+        with self.lock:
+            self.request_reports[report_id] = report
+            while len(self.request_reports) > config.PROFILE_KEEP_REQUESTS:
+                self.request_reports.popitem(last=False)
+        return report_id
+
+    def request_report(self, report_id: str) -> Optional[dict]:
+        with self.lock:
+            return self.request_reports.get(report_id)
+
+
+profiler = WorkerProfiler()
+
+
+def init_profiling(app):
+    """Installe les hooks de profilage sur l'application."""
+
+    @app.before_request
+    def _start_request_profile():
+        single = request.headers.get('X-Profile') == '1' and is_admin_request()
+        if not single and not (profiler.active and profiler.claim()):
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Un autre profileur est déjà actif dans ce thread
+            if not single:
+                profiler.record(profile)
+            return
+        g.profile = profile
+        g.profile_single = single
+
+    @app.after_request
+    def _stop_request_profile(response):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return response
+        profile.disable()
+        if g.pop('profile_single', False):
+            response.headers['X-Profile-Id'] = profiler.record_request(profile)
+        else:
+            profiler.record(profile)
+        return response
+
+    @app.teardown_request
+    def _cleanup_request_profile(exc):
+        # Requête interrompue par une exception : after_request n'a pas été appelé
+        profile = g.pop('profile', None)
+        if profile is not None:
+            profile.disable()
+            if not g.pop('profile_single', False):
+                profiler.record(profile)
@@ -0,0 +1,323 @@
+import os
+import json
+import time
+import queue
+import itertools
+import socket
+import threading
+import socketserver
+from typing import Optional, List, Dict
+import faiss
+import numpy as np
+from config import config
+from .facets import FacetIndex
+
+
+class LocalRetriever:
+    """Recherche FAISS en mémoire sur l'index et les métadonnées du processus."""
+
+    def __init__(self):
+        self.index = faiss.read_index(config.FAISS_INDEX_PATH)
+        with open(config.METADATA_PATH, 'r', encoding='utf-8') as f:
+            self.metadata = json.load(f)
+        self.facets = FacetIndex(self.metadata)
+
+    def document(self, idx: int) -> dict:
+        """Retourne la description d'un document à partir de son identifiant FAISS."""
+        doc = self.metadata[idx]
+        return {
+            "index": idx,
+            "id": doc.get("id"),
+            "title": doc["title"],
+            "url": doc["url"],
+            "content_type": self.facets.content_type_of(idx)
+        }
+
+    def sections(self) -> List[str]:
+        """Sections d'URL connues, utilisables comme filtre."""
+        return self.facets.sections
+
+    def select(self, filters: Optional[dict]) -> Optional[np.ndarray]:
+        """Convertit des filtres de facettes en identifiants (None = pas de filtre)."""
+        if not filters or not any(filters.values()):
+            return None
+        return self.facets.select(
+            filters.get("content_types"),
+            filters.get("sections"),
+            filters.get("objectifs"),
+            filters.get("exclude")
+        )
+
+    def search_batch(self, embeddings: np.ndarray, k: int, ids: Optional[np.ndarray] = None) -> List[List[int]]:
+        """Exécute une seule recherche FAISS pour plusieurs requêtes."""
+        # FAISS alloue k résultats par requête : inutile d'en demander plus que l'index n'en contient
+        k = min(k, self.index.ntotal)
+        if ids is None:
+            if k <= 0:
+                return [[] for _ in range(len(embeddings))]
+            D, I = self.index.search(embeddings, k)
+        else:
+            if len(ids) == 0 or k <= 0:
+                return [[] for _ in range(len(embeddings))]
+            params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(ids))
+            D, I = self.index.search(embeddings, min(k, len(ids)), params=params)
+        return [[int(idx) for idx in row if idx >= 0] for row in I]
+
+    def search(self, embedding: np.ndarray, k: int, filters: Optional[dict] = None) -> List[dict]:
+        """Recherche les k documents les plus proches d'un embedding."""
+        ids = self.select(filters)
+        indices = self.search_batch(embedding.reshape(1, -1), k, ids)[0]
+        return [self.document(idx) for idx in indices]
+
+    def search_many(self, embeddings: np.ndarray, k: int, filters: Optional[dict] = None) -> List[List[dict]]:
+        """Recherche plusieurs embeddings en un seul appel à index.search."""
+        ids = self.select(filters)
+        results = self.search_batch(np.asarray(embeddings, dtype='float32'), k, ids)
+        return [[self.document(idx) for idx in indices] for indices in results]
+
+    def search_multi(self, embedding: np.ndarray, searches: List[dict]) -> List[List[dict]]:
+        """Exécute plusieurs recherches filtrées ({"k", "filters"}) pour un même embedding."""
+        embedding = np.asarray(embedding, dtype='float32').reshape(1, -1)
+        return [
+            [self.document(idx) for idx in self.search_batch(embedding, s["k"], self.select(s.get("filters")))[0]]
+            for s in searches
+        ]
+
+
+class _PendingSearch:
+    """Requête en attente dans un micro-lot."""
+
+    def __init__(self, embedding: np.ndarray, k: int, filters: Optional[dict]):
+        self.embedding = embedding
+        self.k = k
+        self.filters = filters
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class MicroBatcher:
+    """Regroupe les recherches concurrentes en lots exécutés par un seul thread."""
+
+    def __init__(self, retriever: LocalRetriever, max_batch: int = None, max_wait_ms: float = None):
+        self.retriever = retriever
+        self.max_batch = max_batch or config.RETRIEVAL_BATCH_SIZE
+        self.max_wait = (max_wait_ms if max_wait_ms is not None else config.RETRIEVAL_BATCH_WAIT_MS) / 1000
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _vector(self, embedding) -> np.ndarray:
+        """Aplatit un embedding et vérifie sa dimension avant la mise en file.
+
+        Un vecteur invalide ferait échouer toutes les requêtes de son groupe.
+        """
+        vector = np.asarray(embedding, dtype='float32').reshape(-1)
+        if vector.shape[0] != self.retriever.index.d:
+            raise ValueError(f"Embedding dimension {vector.shape[0]} does not match the index ({self.retriever.index.d})")
+        return vector
+
+    def _submit(self, pendings: List[_PendingSearch]) -> List[List[dict]]:
+        """Met les recherches en file d'un coup (même micro-lot) et attend leurs résultats."""
+        for pending in pendings:
+            self.queue.put(pending)
+        for pending in pendings:
+            pending.done.wait()
+            if pending.error:
+                raise pending.error
+        return [pending.result for pending in pendings]
+
+    def search(self, embedding: np.ndarray, k: int, filters: Optional[dict] = None) -> List[dict]:
+        """Soumet une recherche et attend son résultat."""
+        return self._submit([_PendingSearch(self._vector(embedding), k, filters)])[0]
+
+    def search_many(self, embeddings: np.ndarray, k: int, filters: Optional[dict] = None) -> List[List[dict]]:
+        """Soumet plusieurs recherches d'un coup ; elles rejoignent le même micro-lot."""
+        return self._submit([
+            _PendingSearch(self._vector(embedding), k, filters)
+            for embedding in embeddings
+        ])
+
+    def search_multi(self, embedding: np.ndarray, searches: List[dict]) -> List[List[dict]]:
+        """Soumet plusieurs recherches filtrées d'un même embedding dans le même micro-lot."""
+        embedding = self._vector(embedding)
+        return self._submit([_PendingSearch(embedding, s["k"], s.get("filters")) for s in searches])
+
+    def _collect(self) -> List[_PendingSearch]:
+        """Attend une première requête puis accumule les suivantes pendant max_wait au total."""
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self.queue.get(timeout=remaining))
+                else:
+                    # Fenêtre écoulée : on prend seulement ce qui est déjà en file
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # Les requêtes partageant les mêmes filtres sont exécutées ensemble
+            groups: Dict[str, List[_PendingSearch]] = {}
+            for pending in batch:
+                key = json.dumps(pending.filters, sort_keys=True)
+                groups.setdefault(key, []).append(pending)
+
+            for group in groups.values():
+                try:
+                    ids = self.retriever.select(group[0].filters)
+                    embeddings = np.stack([p.embedding for p in group])
+                    k = max(p.k for p in group)
+                    results = self.retriever.search_batch(embeddings, k, ids)
+                    for pending, indices in zip(group, results):
+                        pending.result = [self.retriever.document(idx) for idx in indices[:pending.k]]
+                except Exception as e:
+                    for pending in group:
+                        pending.error = e
+                for pending in group:
+                    pending.done.set()
+
+
+class _RetrievalHandler(socketserver.StreamRequestHandler):
+    """Traite des requêtes JSON (une par ligne) sur une connexion persistante."""
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                if request.get("sections"):
+                    results = self.server.batcher.retriever.sections()
+                elif "searches" in request:
+                    results = self.server.batcher.search_multi(
+                        np.array(request["embedding"], dtype='float32'),
+                        request["searches"]
+                    )
+                elif "embeddings" in request:
+                    results = self.server.batcher.search_many(
+                        np.array(request["embeddings"], dtype='float32'),
+                        request.get("k", 3),
+                        request.get("filters")
+                    )
+                else:
+                    results = self.server.batcher.search(
+                        np.array(request["embedding"], dtype='float32'),
+                        request.get("k", 3),
+                        request.get("filters")
+                    )
+                response = {"id": request.get("id"), "results": results}
+            except Exception as e:
+                response = {"id": None, "error": str(e)}
+            self.wfile.write(json.dumps(response).encode('utf-8') + b"\n")
+            self.wfile.flush()
+
+
+class RetrievalServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Service de recherche partagé par tous les workers via un socket Unix."""
+
+    daemon_threads = True
+    # File d'attente de listen() : tous les threads des workers se connectent au démarrage
+    request_queue_size = config.RETRIEVAL_BACKLOG
+
+    def __init__(self, socket_path: str = None, retriever: LocalRetriever = None):
+        socket_path = socket_path or config.RETRIEVAL_SOCKET_PATH
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        self.batcher = MicroBatcher(retriever or LocalRetriever())
+        super().__init__(socket_path, _RetrievalHandler)
+
+
+class SidecarRetriever:
+    """Client du service de recherche, avec une connexion persistante par thread."""
+
+    def __init__(self, socket_path: str = None, timeout: float = None):
+        self.socket_path = socket_path or config.RETRIEVAL_SOCKET_PATH
+        self.timeout = timeout or config.RETRIEVAL_TIMEOUT
+        self._local = threading.local()
+        self._ids = itertools.count(1)
+        self._sections = None
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            # connect() bloquant : avec un délai, un socket Unix dont la file
+            # d'attente est pleine échoue aussitôt (EAGAIN) au lieu d'attendre
+            sock.connect(self.socket_path)
+            sock.settimeout(self.timeout)
+            conn = (sock, sock.makefile('rb'))
+            self._local.conn = conn
+        return conn
+
+    def _reset(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn[1].close()
+            conn[0].close()
+        self._local.conn = None
+
+    def _request(self, request: dict):
+        request["id"] = next(self._ids)
+        try:
+            sock, reader = self._connection()
+            sock.sendall(json.dumps(request).encode('utf-8') + b"\n")
+            line = reader.readline()
+            if not line:
+                raise ConnectionError("Retrieval service closed the connection")
+        except Exception:
+            self._reset()
+            raise
+        response = json.loads(line)
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response["results"]
+
+    def sections(self) -> List[str]:
+        """Sections d'URL connues du service (mises en cache)."""
+        if self._sections is None:
+            self._sections = self._request({"sections": True})
+        return self._sections
+
+    def search(self, embedding: np.ndarray, k: int, filters: Optional[dict] = None) -> List[dict]:
+        """Envoie la recherche au service et retourne les documents trouvés."""
+        return self._request({
+            "embedding": np.asarray(embedding, dtype='float32').reshape(-1).tolist(),
+            "k": k,
+            "filters": filters
+        })
+
+    def search_many(self, embeddings: np.ndarray, k: int, filters: Optional[dict] = None) -> List[List[dict]]:
+        """Envoie plusieurs recherches au service en une seule requête."""
+        return self._request({
+            "embeddings": np.asarray(embeddings, dtype='float32').tolist(),
+            "k": k,
+            "filters": filters
+        })
+
+    def search_multi(self, embedding: np.ndarray, searches: List[dict]) -> List[List[dict]]:
+        """Envoie plusieurs recherches filtrées d'un même embedding en une seule requête."""
+        return self._request({
+            "embedding": np.asarray(embedding, dtype='float32').reshape(-1).tolist(),
+            "searches": searches
+        })
+
+
+def create_retriever():
+    """Crée le moteur de recherche selon config.RETRIEVAL_MODE ('local' ou 'sidecar')."""
+    if config.RETRIEVAL_MODE == "sidecar":
+        return SidecarRetriever()
+    return LocalRetriever()
+
+
+if __name__ == "__main__":
+    server = RetrievalServer()
+    print(f"Retrieval service listening on {config.RETRIEVAL_SOCKET_PATH}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(config.RETRIEVAL_SOCKET_PATH)
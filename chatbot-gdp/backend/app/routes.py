@@ -1,27 +1,21 @@
-from . import app  # Import de l'instance app
 from flask import Blueprint, current_app, request, jsonify
+from .auth import is_admin_request
+from .profiling import profiler
+from .routing import router
 
+# Routes de l'API, enregistrées sous /api par create_app
 api_bp = Blueprint('api', __name__)
 
 @api_bp.route('/chat', methods=['POST'])
 def chat():
-    try:
-        data = request.get_json()
-        # Your chat logic here
-        return jsonify({"status": "success"})
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-
-@app.route('/api/chat', methods=['POST'])
-def chat():
-    chatbot = current_app.chatbot
+    conversations = current_app.conversations
     try:
         data = request.get_json()
         question = data.get('question')
         conversation_id = data.get('conversation_id')
         
-        # Traitement du message avec le chatbot
-        response = chatbot.process_message(question)
+        # Traitement du message avec le chatbot de la conversation
+        conversation_id, response = conversations.process_message(conversation_id, question)
         
         return jsonify({
             'content': response,
@@ -34,7 +28,83 @@ def chat():
             'status': 'error'
         }), 500
 
-@app.after_request
+@api_bp.route('/search', methods=['POST'])
+def search():
+    try:
+        data = request.get_json() or {}
+        filters = {
+            "content_types": data.get('content_types'),
+            "sections": data.get('sections')
+        }
+        result = current_app.search.search(
+            queries=data.get('queries'),
+            vectors=data.get('vectors'),
+            page=data.get('page', 1),
+            per_page=data.get('per_page', 10),
+            filters=filters
+        )
+        return jsonify(result)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api_bp.route('/analytics/leads', methods=['GET'])
+def lead_analytics():
+    if not is_admin_request():
+        return jsonify({'error': 'Unauthorized'}), 401
+    try:
+        rows = current_app.db.get_lead_stats(
+            request.args.get('dimension', 'total'),
+            request.args.get('granularity', 'month'),
+            request.args.get('start'),
+            request.args.get('end')
+        )
+        return jsonify({'stats': rows})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api_bp.route('/admin/profile', methods=['GET'])
+def profile_status():
+    if not is_admin_request():
+        return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify({'status': profiler.status(), 'report': profiler.last_report})
+
+@api_bp.route('/admin/profile/start', methods=['POST'])
+def profile_start():
+    if not is_admin_request():
+        return jsonify({'error': 'Unauthorized'}), 401
+    try:
+        data = request.get_json(silent=True) or {}
+        status = profiler.start(int(data.get('requests', 20)), bool(data.get('memory', False)))
+        return jsonify({'status': status})
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
+@api_bp.route('/admin/profile/stop', methods=['POST'])
+def profile_stop():
+    if not is_admin_request():
+        return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify({'report': profiler.stop()})
+
+@api_bp.route('/admin/profile/<report_id>', methods=['GET'])
+def profile_request_report(report_id):
+    if not is_admin_request():
+        return jsonify({'error': 'Unauthorized'}), 401
+    report = profiler.request_report(report_id)
+    if report is None:
+        return jsonify({'error': 'Unknown profile id'}), 404
+    return jsonify({'report': report})
+
+@api_bp.route('/admin/routing', methods=['GET'])
+def routing_status():
+    if not is_admin_request():
+        return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify({'routing': router.snapshot()})
+
+@api_bp.after_app_request
 def after_request(response):
     response.headers.add('Access-Control-Allow-Origin', 'https://doriangdp.github.io')
     response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
@@ -43,7 +113,7 @@ def after_request(response):
     return response
 
 # Ajoutez les autres routes nécessaires
-@app.route('/api/check_timeout', methods=['POST'])
+@api_bp.route('/check_timeout', methods=['POST'])
 def check_timeout():
     try:
         data = request.get_json()
@@ -53,18 +123,19 @@ def check_timeout():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/chat/end_conversation', methods=['POST'])
+@api_bp.route('/chat/end_conversation', methods=['POST'])
 def end_conversation():
     try:
         data = request.get_json()
         conversation_id = data.get('conversation_id')
         status = data.get('status')
         # Logique de fin de conversation
+        current_app.conversations.end(conversation_id)
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/reset_conversation', methods=['POST'])
+@api_bp.route('/reset_conversation', methods=['POST'])
 def reset_conversation():
     try:
         data = request.get_json()
@@ -0,0 +1,264 @@
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, List, Tuple, Any
+import numpy as np
+import openai
+from config import config
+
+
+class ModelStats:
+    """Latences et erreurs observées sur une fenêtre glissante pour un modèle."""
+
+    def __init__(self, window: int):
+        self.calls = deque(maxlen=window)
+        self.last_attempt = 0.0
+
+    def record(self, latency: float, error: bool):
+        self.calls.append((latency, error))
+
+    @property
+    def count(self) -> int:
+        return len(self.calls)
+
+    @property
+    def error_rate(self) -> float:
+        if not self.calls:
+            return 0.0
+        return sum(1 for _, error in self.calls if error) / len(self.calls)
+
+    def latency_percentile(self, q: float) -> float:
+        latencies = [latency for latency, error in self.calls if not error]
+        if not latencies:
+            return 0.0
+        return float(np.percentile(latencies, q))
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.count,
+            "error_rate": round(self.error_rate, 3),
+            "p50": round(self.latency_percentile(50), 3),
+            "p90": round(self.latency_percentile(90), 3)
+        }
+
+
+class CircuitOpenError(Exception):
+    """Levée sans appel réseau quand les disjoncteurs de tous les modèles d'une étape sont ouverts."""
+
+
+def is_service_failure(error: Exception) -> bool:
+    """Erreur imputable au service (délai, connexion, 429, 5xx) et non à la requête.
+
+    Seules ces erreurs comptent contre un modèle : une requête invalide (4xx)
+    échouerait de la même façon sur tous les modèles.
+    """
+    if isinstance(error, (TimeoutError, ConnectionError, openai.APIConnectionError)):
+        return True
+    status = getattr(error, 'status_code', None)
+    return status is not None and (status == 429 or status >= 500)
+
+
+class CircuitBreaker:
+    """Disjoncteur d'un modèle pour une étape : ouvert après N échecs consécutifs.
+
+    Pendant config.CIRCUIT_COOLDOWN secondes les appels échouent immédiatement,
+    puis un seul appel d'essai est autorisé : s'il réussit le circuit se referme.
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return "open"
+        return "half-open"
+
+    def allow(self) -> bool:
+        with self.lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial_running or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self.trial_running = False
+
+
+class ModelRouter:
+    """Choisit le modèle de chaque étape selon la latence et le taux d'erreur observés.
+
+    Le modèle principal est utilisé tant qu'il respecte le budget de latence de
+    l'étape ; sinon les modèles de repli passent devant. Un modèle écarté est
+    de nouveau essayé après config.ROUTER_PROBE_INTERVAL secondes.
+    """
+
+    def __init__(self, stage_models: Dict[str, List[str]] = None,
+                 budgets: Dict[str, float] = None):
+        self.stage_models = stage_models or config.STAGE_MODELS
+        self.budgets = budgets or config.STAGE_LATENCY_BUDGETS
+        self.stats: Dict[Tuple[str, str], ModelStats] = {}
+        self.breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+        self.lock = threading.Lock()
+        self.hedge_pool = ThreadPoolExecutor(max_workers=config.HEDGE_WORKERS,
+                                             thread_name_prefix="hedge")
+
+    def _stats(self, stage: str, model: str) -> ModelStats:
+        key = (stage, model)
+        if key not in self.stats:
+            self.stats[key] = ModelStats(config.ROUTER_WINDOW)
+        return self.stats[key]
+
+    def _healthy(self, stage: str, model: str, now: float) -> bool:
+        stats = self._stats(stage, model)
+        if stats.count < config.ROUTER_MIN_SAMPLES:
+            return True
+        if now - stats.last_attempt > config.ROUTER_PROBE_INTERVAL:
+            return True
+        budget = self.budgets.get(stage)
+        if budget is not None and stats.latency_percentile(90) > budget:
+            return False
+        return stats.error_rate <= config.ROUTER_MAX_ERROR_RATE
+
+    def candidates(self, stage: str) -> List[str]:
+        """Retourne les modèles de l'étape, les modèles sains en premier."""
+        models = self.stage_models[stage]
+        now = time.monotonic()
+        with self.lock:
+            healthy = [m for m in models if self._healthy(stage, m, now)]
+        return healthy + [m for m in models if m not in healthy]
+
+    def record(self, stage: str, model: str, latency: float, error: bool = False):
+        with self.lock:
+            stats = self._stats(stage, model)
+            stats.record(latency, error)
+            stats.last_attempt = time.monotonic()
+
+    def breaker(self, stage: str, model: str) -> CircuitBreaker:
+        key = (stage, model)
+        with self.lock:
+            if key not in self.breakers:
+                self.breakers[key] = CircuitBreaker(config.CIRCUIT_FAILURE_THRESHOLD,
+                                                    config.CIRCUIT_COOLDOWN)
+            return self.breakers[key]
+
+    def hedge_delay(self, stage: str, model: str) -> float:
+        """Délai avant la requête de couverture : p95 observé du modèle."""
+        with self.lock:
+            stats = self._stats(stage, model)
+            if stats.count < config.ROUTER_MIN_SAMPLES:
+                return config.HEDGE_DEFAULT_DELAY
+            return max(stats.latency_percentile(95), config.HEDGE_MIN_DELAY)
+
+    def _scoped(self, client, deadline: float):
+        """Client dont le délai est le temps restant avant l'échéance de l'essai."""
+        return client.with_options(timeout=max(deadline - time.monotonic(), 0.001),
+                                   max_retries=config.OPENAI_MAX_RETRIES)
+
+    def _hedged(self, fn: Callable[[], Any], delay: float, deadline: float) -> Any:
+        """Exécute fn ; sans réponse après delay, lance un doublon et garde la première réponse."""
+        first = self.hedge_pool.submit(fn)
+        done, _ = wait([first], timeout=min(delay, max(deadline - time.monotonic(), 0)))
+        if done:
+            return first.result()
+        pending = {first}
+        if time.monotonic() < deadline:
+            pending.add(self.hedge_pool.submit(fn))
+        error = TimeoutError("Attempt deadline exceeded")
+        while pending:
+            done, pending = wait(pending, timeout=max(deadline - time.monotonic(), 0),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def call(self, stage: str, client, fn: Callable[[Any, str], Any]) -> Any:
+        """Appelle fn(client, model) en basculant sur le modèle suivant en cas d'erreur.
+
+        Le délai config.STAGE_TIMEOUTS[stage] vaut pour l'étape entière et est
+        partagé entre les modèles restants : un modèle principal bloqué laisse
+        leur part aux modèles de repli. Les étapes idempotentes de
+        config.HEDGED_STAGES sont doublées après le p95 observé. Chaque modèle a
+        son disjoncteur ; si tous sont ouverts, CircuitOpenError est levée sans
+        appel réseau. Une erreur de requête (voir is_service_failure) est
+        propagée sans essayer d'autre modèle ni pénaliser celui-ci.
+        """
+        deadline = time.monotonic() + config.STAGE_TIMEOUTS[stage]
+        candidates = self.candidates(stage)
+        last_error = None
+        for position, model in enumerate(candidates):
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            breaker = self.breaker(stage, model)
+            if not breaker.allow():
+                continue
+            # Part du temps restant : ce modèle et ceux dont le disjoncteur n'est pas ouvert
+            remaining = [m for m in candidates[position + 1:] if self.breaker(stage, m).state != "open"]
+            attempt_deadline = now + (deadline - now) / (len(remaining) + 1)
+            start = time.monotonic()
+            try:
+                if stage in config.HEDGED_STAGES:
+                    result = self._hedged(lambda: fn(self._scoped(client, attempt_deadline), model),
+                                          self.hedge_delay(stage, model), attempt_deadline)
+                else:
+                    result = fn(self._scoped(client, attempt_deadline), model)
+            except Exception as e:
+                if not is_service_failure(e):
+                    # Le service a répondu : le modèle n'est pas en cause
+                    breaker.success()
+                    raise
+                self.record(stage, model, time.monotonic() - start, error=True)
+                breaker.failure()
+                print(f"Model {model} failed for {stage}: {str(e)}")
+                last_error = e
+                continue
+            self.record(stage, model, time.monotonic() - start)
+            breaker.success()
+            return result
+        if last_error is None:
+            if time.monotonic() < deadline:
+                raise CircuitOpenError(f"Circuit open for every model of {stage}")
+            last_error = TimeoutError(f"Deadline exceeded for {stage}")
+        raise last_error
+
+    def snapshot(self) -> dict:
+        """Statistiques courantes par étape et par modèle, et état des disjoncteurs."""
+        with self.lock:
+            snapshot = {
+                f"{stage}/{model}": stats.to_dict()
+                for (stage, model), stats in self.stats.items()
+            }
+            snapshot.update({
+                f"{stage}/{model}/circuit": breaker.state
+                for (stage, model), breaker in self.breakers.items()
+            })
+            return snapshot
+
+
+router = ModelRouter()
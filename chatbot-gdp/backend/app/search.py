@@ -0,0 +1,105 @@
+from typing import Optional, List
+import numpy as np
+from config import config
+from .routing import router
+from .facets import CONTENT_TYPES
+
+
+class SearchService:
+    """Recherche d'articles pour plusieurs requêtes (texte ou vecteurs) à la fois.
+
+    Les textes sont transformés en embeddings par requêtes groupées, puis
+    tous les vecteurs sont recherchés en un seul appel au moteur.
+    """
+
+    def __init__(self, openai_client, retriever):
+        self.client = openai_client
+        self.retriever = retriever
+
+    def embed(self, queries: List[str]) -> np.ndarray:
+        """Calcule les embeddings de plusieurs textes avec un appel par lot."""
+        vectors = []
+        batch_size = config.SEARCH_EMBEDDING_BATCH
+        for start in range(0, len(queries), batch_size):
+            chunk = queries[start:start + batch_size]
+            response = router.call("embeddings", self.client, lambda client, model: client.embeddings.create(
+                model=model,
+                input=chunk
+            ))
+            # L'API peut renvoyer les embeddings dans le désordre
+            for item in sorted(response.data, key=lambda item: item.index):
+                vectors.append(item.embedding)
+        return np.array(vectors, dtype='float32').reshape(len(queries), -1)
+
+    def _check_filters(self, filters: dict):
+        """Vérifie que les filtres sont des listes de valeurs connues."""
+        known = {"content_types": CONTENT_TYPES, "sections": None}
+        for name, allowed in known.items():
+            values = filters.get(name)
+            if values is None:
+                continue
+            if not isinstance(values, list) or not all(isinstance(v, str) for v in values):
+                raise ValueError(f"'{name}' must be a list of strings")
+            allowed = allowed or self.retriever.sections()
+            unknown = [v for v in values if v not in allowed]
+            if unknown:
+                raise ValueError(f"Unknown {name}: {', '.join(unknown)}")
+
+    def search(self, queries: Optional[List[str]] = None, vectors: Optional[list] = None,
+               page: int = 1, per_page: int = 10, filters: Optional[dict] = None) -> dict:
+        """Retourne une page de résultats (titre, url) pour chaque requête.
+
+        Raises:
+            ValueError: si les paramètres sont invalides
+        """
+        for name, value in (("page", page), ("per_page", per_page)):
+            if not isinstance(value, int) or isinstance(value, bool):
+                raise ValueError(f"'{name}' must be an integer")
+        self._check_filters(filters or {})
+        if bool(queries) == bool(vectors):
+            raise ValueError("Provide either 'queries' or 'vectors'")
+        if not isinstance(queries or vectors, list):
+            raise ValueError("'queries' and 'vectors' must be lists")
+        count = len(queries or vectors)
+        if count > config.SEARCH_MAX_QUERIES:
+            raise ValueError(f"At most {config.SEARCH_MAX_QUERIES} queries per call")
+        if not 1 <= per_page <= config.SEARCH_MAX_PER_PAGE:
+            raise ValueError(f"'per_page' must be between 1 and {config.SEARCH_MAX_PER_PAGE}")
+        # Les résultats au-delà de SEARCH_MAX_RESULTS ne sont pas paginés
+        max_page = max(config.SEARCH_MAX_RESULTS // per_page, 1)
+        if not 1 <= page <= max_page:
+            raise ValueError(f"'page' must be between 1 and {max_page} for per_page={per_page}")
+
+        if queries:
+            if not all(isinstance(q, str) and q.strip() for q in queries):
+                raise ValueError("'queries' must be non-empty strings")
+            if any(len(q) > config.SEARCH_MAX_QUERY_CHARS for q in queries):
+                raise ValueError(f"Queries are limited to {config.SEARCH_MAX_QUERY_CHARS} characters")
+            embeddings = self.embed(queries)
+        else:
+            try:
+                embeddings = np.array(vectors, dtype='float32')
+            except (TypeError, ValueError):
+                embeddings = None
+            if embeddings is None or embeddings.ndim != 2 or embeddings.shape[1] != config.EMBEDDING_DIMENSION:
+                raise ValueError(f"'vectors' must be a list of {config.EMBEDDING_DIMENSION}-dimension vectors")
+
+        # Un résultat de plus que la page pour savoir s'il en reste
+        offset = (page - 1) * per_page
+        results = self.retriever.search_many(embeddings, offset + per_page + 1, filters)
+
+        return {
+            "page": page,
+            "per_page": per_page,
+            "results": [
+                {
+                    "query": queries[i] if queries else i,
+                    "items": [
+                        {"title": doc["title"], "url": doc["url"], "content_type": doc["content_type"]}
+                        for doc in docs[offset:offset + per_page]
+                    ],
+                    "has_more": len(docs) > offset + per_page
+                }
+                for i, docs in enumerate(results)
+            ]
+        }
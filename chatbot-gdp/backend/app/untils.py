@@ -1,5 +1,4 @@
 from config import config
-from app import app_instance
 import re
 from typing import Tuple, Optional, List
 from unidecode import unidecode
@@ -207,4 +206,35 @@ def normalize_string(text: str) -> str:
     Returns:
         str: Le texte normalisé
     """
-    return unidecode(text.lower().strip())
\ No newline at end of file
+    return unidecode(text.lower().strip())
+
+def normalize_email(email: Optional[str]) -> Optional[str]:
+    """Normalise une adresse email pour la recherche d'un prospect déjà connu.
+    
+    Args:
+        email (Optional[str]): L'email à normaliser
+        
+    Returns:
+        Optional[str]: L'email en minuscules sans espaces, ou None
+    """
+    if not email:
+        return None
+    return email.strip().lower() or None
+
+def normalize_phone(phone: Optional[str]) -> Optional[str]:
+    """Normalise un numéro de téléphone au format national sans séparateurs.
+    
+    Args:
+        phone (Optional[str]): Le numéro à normaliser
+        
+    Returns:
+        Optional[str]: Le numéro sous la forme 0612345678, ou None
+    """
+    if not phone:
+        return None
+    cleaned = re.sub(r'[^\d+]', '', str(phone))
+    if cleaned.startswith('+33'):
+        cleaned = '0' + cleaned[3:]
+    elif cleaned.startswith('0033'):
+        cleaned = '0' + cleaned[4:]
+    return cleaned or None
@@ -0,0 +1,148 @@
+"""Compare la précision et la latence de l'extraction selon le modèle.
+
+Usage (depuis chatbot-gdp/backend) :
+    python -m benchmarks.extraction_benchmark [modèle ...] [--repeat N] [--from-db [CHEMIN]]
+
+Le contexte de chaque cas est reconstruit comme en production : question
+du chatbot (options numérotées comprises) suivie de la réponse. Avec
+--from-db, les cas viennent des conversations enregistrées dans la base.
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import numpy as np
+from openai import OpenAI
+from config import config
+from app.chat_handler import EXTRACTION_FUNCTION, build_extraction_messages, build_field_question
+from app.models import Lead
+from app.untils import normalize_string
+
+CONVERSATIONS_PATH = os.path.join(os.path.dirname(__file__), 'conversations.json')
+
+
+def _normalize(value):
+    if isinstance(value, dict) and "montant" in value:
+        value = value["montant"]
+    if isinstance(value, list):
+        return sorted(_normalize(v) for v in value)
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str) and value.replace('.', '', 1).isdigit():
+        return float(value)
+    return normalize_string(str(value))
+
+
+def score(expected: dict, extracted: dict) -> float:
+    """Part des champs attendus correctement extraits."""
+    hits = sum(1 for key, value in expected.items()
+               if key in extracted and _normalize(extracted[key]) == _normalize(value))
+    return hits / len(expected)
+
+
+def case_context(case: dict) -> str:
+    """Contexte envoyé au modèle : les 3 derniers messages, comme _extract_information."""
+    if "context" in case:
+        return case["context"]
+    return "\n".join([build_field_question(case["field"]), case["message"]])
+
+
+def recorded_cases(db_path: str) -> list:
+    """Construit des cas à partir des conversations enregistrées dans la base des leads.
+
+    Une réponse est retenue quand elle suit une question actuelle du chatbot ;
+    la valeur attendue est celle conservée dans le lead à la fin de la conversation.
+    """
+    questions = {build_field_question(field): field for field in Lead.REQUIRED_FIELDS}
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute(f"SELECT conversation_history, {', '.join(Lead.REQUIRED_FIELDS)} FROM leads").fetchall()
+    finally:
+        conn.close()
+
+    cases = []
+    for history, *values in rows:
+        lead = Lead.from_dict({
+            "conversation_id": "", "conversation_history": history or "[]",
+            **dict(zip(Lead.REQUIRED_FIELDS, values))
+        })
+        if not isinstance(lead.conversation_history, list):
+            continue
+        messages = lead.conversation_history
+        for i in range(1, len(messages)):
+            if messages[i]["role"] != "user" or messages[i - 1]["role"] != "assistant":
+                continue
+            # La question peut être précédée d'un message d'accueil
+            question = messages[i - 1]["content"].strip()
+            field = next((f for q, f in questions.items() if question.endswith(q)), None)
+            if field is None or getattr(lead, field) is None:
+                continue
+            cases.append({
+                "field": field,
+                "context": "\n".join(m["content"] for m in messages[max(i - 2, 0):i + 1]),
+                "message": messages[i]["content"],
+                "expected": {field: getattr(lead, field)}
+            })
+    return cases
+
+
+def run_model(client: OpenAI, model: str, cases: list, repeat: int) -> dict:
+    latencies, scores, errors = [], [], 0
+    for _ in range(repeat):
+        for case in cases:
+            messages = build_extraction_messages(case_context(case), case["field"], case["message"])
+            start = time.monotonic()
+            try:
+                response = client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    functions=[EXTRACTION_FUNCTION],
+                    function_call={"name": "extract_lead_info"}
+                )
+                extracted = json.loads(response.choices[0].message.function_call.arguments)
+            except Exception as e:
+                print(f"  {model} error on '{case['message']}': {str(e)}")
+                errors += 1
+                scores.append(0.0)
+                continue
+            latencies.append(time.monotonic() - start)
+            scores.append(score(case["expected"], extracted))
+
+    return {
+        "accuracy": float(np.mean(scores)),
+        "p50": float(np.percentile(latencies, 50)) if latencies else float('nan'),
+        "p90": float(np.percentile(latencies, 90)) if latencies else float('nan'),
+        "errors": errors
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('models', nargs='*', default=config.STAGE_MODELS["extraction"])
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--from-db', nargs='?', const=config.DATABASE_PATH, default=None,
+                        help="utilise les conversations enregistrées (base des leads)")
+    args = parser.parse_args(argv)
+
+    if args.from_db:
+        cases = recorded_cases(args.from_db)
+        if not cases:
+            print(f"Aucune réponse à une question actuelle du chatbot dans {args.from_db}")
+            return
+    else:
+        with open(CONVERSATIONS_PATH, 'r', encoding='utf-8') as f:
+            cases = json.load(f)
+
+    client = OpenAI(api_key=config.OPENAI_API_KEY)
+    print(f"{len(cases)} cas x {args.repeat} répétition(s)\n")
+    print(f"{'modèle':<20}{'précision':>10}{'p50 (s)':>10}{'p90 (s)':>10}{'erreurs':>10}")
+    for model in args.models:
+        result = run_model(client, model, cases, args.repeat)
+        print(f"{model:<20}{result['accuracy']:>10.1%}{result['p50']:>10.2f}"
+              f"{result['p90']:>10.2f}{result['errors']:>10}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,69 @@
+"""Vérifie la bascule du routeur quand le modèle principal ne répond plus.
+
+Le modèle principal de l'étape reste bloqué jusqu'à l'expiration du délai qui
+lui est accordé ; le modèle de repli répond normalement. Chaque appel doit
+aboutir grâce au repli, dans le délai de l'étape, y compris une fois le
+disjoncteur du modèle principal ouvert.
+
+Usage (depuis chatbot-gdp/backend) :
+    python -m benchmarks.router_failover [--calls N] [--stage-timeout S]
+"""
+import sys
+import json
+import time
+import argparse
+from config import config
+from app.routing import ModelRouter
+
+
+class HangingClient:
+    """Client simulé : le modèle bloqué attend tout son délai puis expire."""
+
+    def __init__(self, hanging_model: str, latency: float, timeout: float = None):
+        self.hanging_model = hanging_model
+        self.latency = latency
+        self.timeout = timeout
+
+    def with_options(self, timeout=None, **options):
+        return HangingClient(self.hanging_model, self.latency, timeout)
+
+    def complete(self, model: str) -> str:
+        if model == self.hanging_model:
+            time.sleep(self.timeout)
+            raise TimeoutError(f"{model} timed out after {self.timeout:.2f}s")
+        time.sleep(self.latency)
+        return model
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=10)
+    parser.add_argument('--stage-timeout', type=float, default=1.0)
+    parser.add_argument('--latency', type=float, default=0.05)
+    args = parser.parse_args()
+
+    stage = 'extraction'
+    primary, fallback = config.STAGE_MODELS[stage][:2]
+    config.STAGE_TIMEOUTS = {**config.STAGE_TIMEOUTS, stage: args.stage_timeout}
+    router = ModelRouter()
+    client = HangingClient(primary, args.latency)
+
+    failures = 0
+    for i in range(args.calls):
+        start = time.monotonic()
+        try:
+            model = router.call(stage, client, lambda c, m: c.complete(m))
+        except Exception as e:
+            model = f"error: {type(e).__name__}: {e}"
+        elapsed = time.monotonic() - start
+        ok = model == fallback and elapsed <= args.stage_timeout + 0.1
+        failures += not ok
+        print(f"call {i + 1:2d}: {model:<24} {elapsed:.2f}s {'ok' if ok else 'FAILED'}")
+
+    print(json.dumps(router.snapshot(), indent=2))
+    print(f"{args.calls - failures}/{args.calls} calls served by {fallback}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
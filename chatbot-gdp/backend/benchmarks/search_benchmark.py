@@ -0,0 +1,73 @@
+"""Compare la recherche groupée (SearchService) à une boucle requête par requête.
+
+Usage (depuis chatbot-gdp/backend) :
+    python -m benchmarks.search_benchmark [--queries N] [--repeat R] [--fake]
+
+--fake utilise un client OpenAI simulé (latence réseau fixe par appel) ; sinon
+OPENAI_API_KEY est requis.
+"""
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from openai import OpenAI
+from config import config
+from app.retrieval import LocalRetriever
+from app.search import SearchService
+from benchmarks.stress_conversations import FakeOpenAI
+
+
+def load_queries(n: int) -> list:
+    """Utilise les titres des articles indexés comme requêtes réalistes."""
+    with open(config.METADATA_PATH, 'r', encoding='utf-8') as f:
+        titles = [doc["title"] for doc in json.load(f)]
+    return [titles[i % len(titles)] for i in range(n)]
+
+
+def run_loop(client, retriever, queries: list, k: int) -> list:
+    """Ancienne approche : un embedding et une recherche par requête."""
+    results = []
+    for query in queries:
+        response = client.embeddings.create(model=config.STAGE_MODELS["embeddings"][0], input=query)
+        embedding = np.array(response.data[0].embedding, dtype='float32')
+        results.append(retriever.search(embedding, k))
+    return results
+
+
+def timed(fn, repeat: int) -> list:
+    timings = []
+    for _ in range(repeat):
+        start = time.monotonic()
+        fn()
+        timings.append(time.monotonic() - start)
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--per-page', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--fake', action='store_true', help="client OpenAI simulé")
+    parser.add_argument('--latency', type=float, default=0.1, help="latence simulée par appel (s)")
+    args = parser.parse_args(argv)
+
+    client = FakeOpenAI(args.latency / 2) if args.fake else OpenAI(api_key=config.OPENAI_API_KEY)
+    retriever = LocalRetriever()
+    service = SearchService(client, retriever)
+    queries = load_queries(args.queries)
+
+    loop = timed(lambda: run_loop(client, retriever, queries, args.per_page), args.repeat)
+    batch = timed(lambda: service.search(queries=queries, per_page=args.per_page), args.repeat)
+
+    print(f"{args.queries} requêtes, {args.per_page} résultats, {args.repeat} répétition(s)")
+    print(f"{'mode':<10}{'médiane (s)':>14}{'requêtes/s':>14}")
+    for name, timings in (("boucle", loop), ("groupé", batch)):
+        median = float(np.median(timings))
+        print(f"{name:<10}{median:>14.3f}{args.queries / median:>14.1f}")
+    print(f"gain : x{np.median(loop) / np.median(batch):.1f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
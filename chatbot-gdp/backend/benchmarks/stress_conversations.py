@@ -0,0 +1,178 @@
+"""Stress test du mode multi-thread : conversations concurrentes sur un client OpenAI simulé.
+
+Les messages d'une même conversation sont envoyés en parallèle depuis plusieurs
+threads ; à la fin, chaque lead enregistré doit contenir exactement ses propres
+réponses, son compteur de messages et son historique complet.
+
+Avec --workers N, N gestionnaires indépendants partagent la base comme des
+workers gunicorn : chaque conversation envoie ses messages deux par deux, les
+deux messages d'une paire simultanément à deux workers différents.
+
+Usage (depuis chatbot-gdp/backend) :
+    python -m benchmarks.stress_conversations [--conversations N] [--threads T] [--workers W]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+from config import config
+
+
+class FakeOpenAI:
+    """Client simulé : l'extraction renvoie le JSON du message, avec une latence réseau."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat))
+        self.embeddings = SimpleNamespace(create=self._embed)
+
+    def with_options(self, **options):
+        return self
+
+    def _wait(self):
+        time.sleep(random.uniform(0, 2 * self.latency))
+
+    def _chat(self, model, messages, functions=None, function_call=None):
+        self._wait()
+        if functions:
+            content = messages[-1]["content"]
+            try:
+                json.loads(content)
+            except ValueError:
+                content = "{}"
+            message = SimpleNamespace(function_call=SimpleNamespace(arguments=content), content=None)
+        else:
+            message = SimpleNamespace(content="Analyse simulée.", function_call=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    def _embed(self, model, input):
+        self._wait()
+        texts = input if isinstance(input, list) else [input]
+        data = []
+        for i, text in enumerate(texts):
+            rng = random.Random(text)
+            data.append(SimpleNamespace(index=i, embedding=[rng.random() for _ in range(1536)]))
+        return SimpleNamespace(data=data)
+
+
+def _letters(i: int) -> str:
+    return "".join(chr(ord('a') + int(d)) for d in str(i))
+
+
+def expected_fields(i: int) -> dict:
+    return {
+        "nom": f"Nom{_letters(i)}",
+        "prenom": f"Prenom{_letters(i)}",
+        "email": f"user{i}@example.fr",
+        "telephone": f"06{i:08d}",
+        "age": 20 + i % 60,
+        "situation_familiale": "marié(e)",
+        "profession": config.PROFESSIONS[i % len(config.PROFESSIONS)],
+        "revenu_annuel": 30000 + i,
+        "patrimoine_actuel": 100000 + i,
+        "objectifs_patrimoniaux": [config.OBJECTIFS[i % len(config.OBJECTIFS)]]
+    }
+
+
+def field_messages(i: int) -> list:
+    messages = []
+    for key, value in expected_fields(i).items():
+        if key == "patrimoine_actuel":
+            value = {"montant": value}
+        elif key == "situation_familiale":
+            value = "marié"
+        messages.append(json.dumps({key: value}))
+    return messages
+
+
+def run(conversations: int, threads: int, latency: float, workers: int = 1) -> int:
+    # Import après la configuration de la base temporaire
+    from app.models import DatabaseHandler
+    from app.conversations import ConversationManager
+    from app.retrieval import create_retriever
+
+    retriever = create_retriever()
+    managers = [
+        ConversationManager(FakeOpenAI(latency), db=DatabaseHandler(), retriever=retriever)
+        for _ in range(workers)
+    ]
+    ids = [f"stress-{i}" for i in range(conversations)]
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        if workers == 1:
+            # Les dix réponses de chaque conversation arrivent en parallèle, dans le désordre
+            jobs = [(cid, msg) for i, cid in enumerate(ids) for msg in field_messages(i)]
+            random.shuffle(jobs)
+            list(pool.map(lambda job: managers[0].process_message(*job), jobs))
+        else:
+            def converse(i):
+                messages = field_messages(i)
+                for n in range(0, len(messages), 2):
+                    pair = zip(random.sample(managers, 2), messages[n:n + 2])
+                    senders = [threading.Thread(target=m.process_message, args=(ids[i], msg))
+                               for m, msg in pair]
+                    for sender in senders:
+                        sender.start()
+                    for sender in senders:
+                        sender.join()
+            list(pool.map(converse, range(conversations)))
+        comments = [(cid, f"Commentaire de {cid}") for cid in ids]
+        list(pool.map(lambda job: random.choice(managers).process_message(*job), comments))
+    elapsed = time.monotonic() - start
+
+    errors = 0
+    db = DatabaseHandler()
+    for i, cid in enumerate(ids):
+        lead = db.get_lead(cid)
+        problems = []
+        if lead is None:
+            problems.append("lead absent")
+        else:
+            for key, value in expected_fields(i).items():
+                stored = getattr(lead, key)
+                if key in ("revenu_annuel", "patrimoine_actuel"):
+                    stored = float(stored) if stored is not None else None
+                if stored != value and not (key in ("nom", "prenom") and stored == value.capitalize()):
+                    problems.append(f"{key}={stored!r} (attendu {value!r})")
+            if lead.commentaire != f"Commentaire de {cid}":
+                problems.append(f"commentaire={lead.commentaire!r}")
+            if lead.message_count != 11:
+                problems.append(f"message_count={lead.message_count}")
+            if len(lead.conversation_history) != 22:
+                problems.append(f"historique={len(lead.conversation_history)} messages")
+            roles = [msg["role"] for msg in lead.conversation_history]
+            if any(role != ("user" if n % 2 == 0 else "assistant") for n, role in enumerate(roles)):
+                problems.append("historique entrelacé")
+        if problems:
+            errors += 1
+            print(f"{cid}: {', '.join(problems)}")
+
+    total = conversations * 11
+    print(f"{conversations} conversations, {total} messages, {threads} threads, {workers} worker(s) : "
+          f"{elapsed:.1f}s ({total / elapsed:.0f} messages/s), {errors} lead(s) corrompu(s)")
+    return errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--conversations', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--latency', type=float, default=0.01, help="latence OpenAI simulée (s)")
+    parser.add_argument('--workers', type=int, default=1, help="nombre de workers simulés")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config.DATABASE_PATH = os.path.join(tmp, 'leads.db')
+        errors = run(args.conversations, args.threads, args.latency, args.workers)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
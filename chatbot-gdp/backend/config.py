@@ -6,15 +6,107 @@ class Config:
     OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
     OPENAI_MODEL = "gpt-4o"
     
+    # Bearer token for internal routes (analytics, admin); unset disables them
+    ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+    
+    # Model Routing: models per stage, primary first then fallbacks
+    # (embeddings must stay in the vector space of the FAISS index)
+    STAGE_MODELS = {
+        "extraction": ["gpt-4o-mini", "gpt-4o"],
+        "analysis": [OPENAI_MODEL, "gpt-4o-mini"],
+        "personalization": ["gpt-4o-mini", OPENAI_MODEL],
+        "embeddings": ["text-embedding-ada-002"]
+    }
+    # Latency budgets in seconds (90th percentile of recent calls)
+    STAGE_LATENCY_BUDGETS = {
+        "extraction": 3.0,
+        "analysis": 20.0,
+        "personalization": 5.0,
+        "embeddings": 2.0
+    }
+    # Deadlines in seconds per stage, shared by the primary and fallback
+    # models: each attempt gets the time left, passed to the OpenAI client
+    OPENAI_TIMEOUT = 60
+    OPENAI_MAX_RETRIES = 0
+    STAGE_TIMEOUTS = {
+        "extraction": 8,
+        "analysis": 45,
+        "personalization": 10,
+        "embeddings": 5
+    }
+    # Circuit breaker: open after N consecutive failed calls of a stage
+    CIRCUIT_FAILURE_THRESHOLD = 5
+    CIRCUIT_COOLDOWN = 30
+    # Hedged requests for idempotent stages: duplicate after the observed p95
+    HEDGED_STAGES = {"embeddings"}
+    HEDGE_DEFAULT_DELAY = 1.0
+    HEDGE_MIN_DELAY = 0.1
+    HEDGE_WORKERS = 16
+    ROUTER_MAX_ERROR_RATE = 0.2
+    ROUTER_WINDOW = 50
+    ROUTER_MIN_SAMPLES = 5
+    ROUTER_PROBE_INTERVAL = 30
+    
     # Chat Settings
     MAX_MESSAGES = 15
     
+    # Speculative analysis: start the analysis as soon as the profile is
+    # complete, while the user writes the final comment. If it has not even
+    # started SPECULATIVE_WAIT seconds after the comment, it is dropped and
+    # the analysis runs again with the comment; a running one is awaited
+    SPECULATIVE_ANALYSIS = True
+    SPECULATIVE_WORKERS = 4
+    SPECULATIVE_WAIT = 3
+    
+    # Conversations kept in memory per worker (seconds of inactivity)
+    CONVERSATION_TTL = 3600
+    # Replays of a message whose save lost a race with another worker
+    CONVERSATION_SAVE_ATTEMPTS = 3
+    
+    # Returning Visitors: days after which a known answer is asked again
+    # (fields not listed never go stale)
+    LEAD_FIELD_MAX_AGE_DAYS = {
+        "situation_familiale": 365,
+        "profession": 365,
+        "revenu_annuel": 365,
+        "patrimoine_actuel": 365,
+        "objectifs_patrimoniaux": 180
+    }
+    
     # File Paths
     BASE_DIR = os.path.abspath(os.path.dirname(__file__))
     DATABASE_PATH = os.path.join(BASE_DIR, 'instance', 'leads.db')
     EMBEDDINGS_DIR = os.path.join(BASE_DIR, 'embeddings_db')
     FAISS_INDEX_PATH = os.path.join(EMBEDDINGS_DIR, 'faiss_index.idx')
+    DATABASE_TIMEOUT = 10.0
     METADATA_PATH = os.path.join(EMBEDDINGS_DIR, 'metadata.json')
+    FACETS_PATH = os.path.join(EMBEDDINGS_DIR, 'facets.npz')
+    
+    # Profiling (admin routes, one worker per session)
+    PROFILE_MAX_REQUESTS = 1000
+    PROFILE_TOP = 25
+    PROFILE_TRACEMALLOC_FRAMES = 1
+    PROFILE_KEEP_REQUESTS = 20
+    
+    # Retrieval Settings ('local' = index in each worker, 'sidecar' = shared service)
+    RETRIEVAL_MODE = os.environ.get('RETRIEVAL_MODE', 'local')
+    RETRIEVAL_SOCKET_PATH = os.environ.get('RETRIEVAL_SOCKET_PATH', '/tmp/gdp_retrieval.sock')
+    RETRIEVAL_BATCH_SIZE = 32
+    RETRIEVAL_BATCH_WAIT_MS = 5
+    RETRIEVAL_TIMEOUT = 5.0
+    RETRIEVAL_BACKLOG = 128
+    
+    # Batch Search API
+    EMBEDDING_DIMENSION = 1536
+    SEARCH_EMBEDDING_BATCH = 256
+    SEARCH_MAX_QUERIES = 100
+    SEARCH_MAX_QUERY_CHARS = 2000
+    SEARCH_MAX_PER_PAGE = 50
+    SEARCH_MAX_RESULTS = 500  # deepest result reachable through pagination
+    
+    # Recommendation Settings
+    RECOMMENDATION_COUNT = 3
+    RECOMMENDATION_QUOTAS = {"simulateur": 1}
     
     # Category Options
     PROFESSIONS = [